@@ -0,0 +1,165 @@
+from multiprocessing import Pool
+from contextlib import redirect_stdout
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from fetcher import CONNECTIONS, SOURCE, prefetch
+from scoring import MAX_BLOCK_MB, SEARCHES, check_aggregate
+from spanning import MST_BACKENDS, NEIGHBOURS
+import process
+
+
+MANIFEST_FILENAME = '{}/manifest.json'.format(process.SCRIPTS_DIR)
+
+
+def read_proteins(proteins, filenames):
+    """
+    collects the protein ids from the command line and from files ('-' is stdin), one or more per line.
+    the ids are upper-cased and deduplicated, keeping their first order.
+    """
+    ids = list(proteins)
+    for filename in filenames:
+        if filename == '-':
+            ids.extend(sys.stdin.read().split())
+        else:
+            with open(filename, 'r') as f:
+                ids.extend(f.read().split())
+
+    return list(dict.fromkeys(protein.upper() for protein in ids))
+
+
+def process_protein(task):
+    """
+    runs process.main on a single protein, turning any failure into a manifest entry instead of an exception.
+    """
+    protein, scoring_options = task
+    entry = {'protein': protein}
+    start = time.time()
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            entry['script'] = process.main(protein, **scoring_options)
+        entry['status'] = 'ok'
+    except Exception as e:
+        entry['status'] = 'failed'
+        entry['error'] = '{}: {}'.format(type(e).__name__, e)
+    entry['seconds'] = time.time() - start
+
+    return entry
+
+
+def fetch_failure(protein, error):
+    return {'protein': protein, 'status': 'failed', 'error': 'fetching: {}: {}'.format(type(error).__name__, error),
+            'seconds': 0.0}
+
+
+def run_batch(proteins, workers=1, manifest_filename=MANIFEST_FILENAME, source=SOURCE, connections=CONNECTIONS,
+              **scoring_options):
+    """
+    generates a blender script for every protein, using a pool of workers, and writes a manifest of the run.
+    the missing pdb files are fetched concurrently in the background, and every protein is processed
+    as soon as its file is there.
+    :param proteins: list of protein ids
+    :param workers: number of proteins processed in parallel
+    :param manifest_filename: where to save the manifest
+    :param source: where the missing pdb files are fetched from, see fetcher.fetch_pdb
+    :param connections: number of pdb files fetched at once
+    :param scoring_options: passed to process.main (reader, cache, models, pair_store, result_store, pin_length,
+                            pin_radius, search, max_block_mb, aggregate, top_k, separation, mst_backend, neighbours,
+                            prefilter)
+    :return: the manifest
+    """
+    start = time.time()
+    entries = []
+
+    def record(entry):
+        entries.append(entry)
+        print('  {protein}: {status} ({seconds:.2f}s)'.format(**entry))
+
+    fetched = prefetch(proteins, process.DATA_DIR, source, connections=connections)
+    if workers > 1:
+        with Pool(workers) as pool:
+            results = []
+            for protein, error in fetched:
+                if error:
+                    record(fetch_failure(protein, error))
+                else:
+                    results.append(pool.apply_async(process_protein, ((protein, scoring_options),), callback=record))
+            for result in results:
+                result.wait()
+    else:
+        for protein, error in fetched:
+            record(fetch_failure(protein, error) if error else process_protein((protein, scoring_options)))
+
+    order = {protein: i for i, protein in enumerate(proteins)}
+    entries.sort(key=lambda entry: order[entry['protein']])
+
+    manifest = {
+        'proteins': entries,
+        'succeeded': sum(entry['status'] == 'ok' for entry in entries),
+        'failed': sum(entry['status'] != 'ok' for entry in entries),
+        'seconds': time.time() - start,
+    }
+
+    with open(manifest_filename, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('proteins', help='what proteins to process', type=str, nargs='*')
+    parser.add_argument('--file', help="file with protein ids, or '-' for stdin", type=str,
+                        action='append', default=[])
+    parser.add_argument('--workers', help='number of proteins processed in parallel', type=int, default=1)
+    parser.add_argument('--manifest', help='where to save the manifest of the run', type=str,
+                        default=MANIFEST_FILENAME)
+    parser.add_argument('--max-block-mb', help='memory budget of each block of the pair scoring, in megabytes',
+                        type=float, default=MAX_BLOCK_MB)
+    parser.add_argument('--search', help='how to search for the best bond of each pair of chains',
+                        choices=SEARCHES, default='brute')
+    parser.add_argument('--reader', help='how to read the pdb files', choices=process.READERS, default='biopython')
+    parser.add_argument('--cache', help='cache the parsed pdb files next to them', action='store_true')
+    parser.add_argument('--models', help="comma separated indices of the models to score the bonds against, or 'all'",
+                        type=process.parse_models, default='0,-1')
+    parser.add_argument('--aggregate', help="how to aggregate the deviations over the models: max, mean or p<percentile>",
+                        type=check_aggregate, default='max')
+    parser.add_argument('--top-k', help='number of ranked candidate bonds to keep for every pair of chains',
+                        type=int, default=1)
+    parser.add_argument('--separation', help='minimal number of residues between candidate bonds of a pair of chains',
+                        type=int, default=0)
+    parser.add_argument('--mst', help='score every pair of chains (dense) or only the pairs of near chains (sparse)',
+                        choices=MST_BACKENDS, default='dense')
+    parser.add_argument('--neighbours', help='number of nearest chains paired with every chain by the sparse mst',
+                        type=int, default=NEIGHBOURS)
+    parser.add_argument('--prefilter', help='skip the pairs of chains that are too far apart to be bonded',
+                        action='store_true')
+    parser.add_argument('--source', type=str,
+                        help='where missing pdb files are fetched from: a base url, or a local mirror directory',
+                        default=SOURCE)
+    parser.add_argument('--connections', help='number of pdb files fetched at once', type=int, default=CONNECTIONS)
+    parser.add_argument('--pair-store', help='database of scored pairs of chains, so only changed chains are rescored',
+                        type=str, default=None)
+    parser.add_argument('--result-store', help='database of results, so repeated runs are not computed again',
+                        type=str, default=None)
+    parser.add_argument('--pin-length', help='length of the joints\' safety pins', type=float, default=0.05)
+    parser.add_argument('--pin-radius', help='radius of the joints\' safety pins', type=float, default=0.02)
+
+    args = parser.parse_args()
+
+    _proteins = read_proteins(args.proteins, args.file)
+    if not _proteins:
+        parser.error('no proteins were given')
+
+    _manifest = run_batch(_proteins, workers=args.workers, manifest_filename=args.manifest, source=args.source,
+                          connections=args.connections, reader=args.reader, cache=args.cache, models=args.models,
+                          pair_store=args.pair_store, result_store=args.result_store, pin_length=args.pin_length,
+                          pin_radius=args.pin_radius, search=args.search, max_block_mb=args.max_block_mb,
+                          aggregate=args.aggregate, top_k=args.top_k, separation=args.separation,
+                          mst_backend=args.mst, neighbours=args.neighbours, prefilter=args.prefilter)
+    print('\n{} succeeded, {} failed in {:.2f}s. The manifest is saved as {}.'.format(
+        _manifest['succeeded'], _manifest['failed'], _manifest['seconds'], args.manifest))
@@ -0,0 +1,38 @@
+"""
+compares the scalar calc_rotation, called once per bond, with the batched one of the geometry module.
+usage: python benchmarks/bench_geometry.py
+"""
+import numpy as np
+import math
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geometry import calc_rotation
+
+
+def scalar_calc_rotation(x1, y1, z1, x2, y2, z2):
+    vx, vy, vz = x2 - x1, y2 - y1, z2 - z1
+    distance = math.sqrt(vx * vx + vy * vy + vz * vz)
+
+    phi = math.atan2(vy, vx)
+    theta = math.acos(vz / distance)
+
+    return phi, theta
+
+
+def bench(n_bonds, repeat=5):
+    points = np.random.default_rng(0).random((6, n_bonds)) * 100
+    rows = points.T.tolist()
+
+    scalar = min(timeit.repeat(lambda: [scalar_calc_rotation(*row) for row in rows], number=1, repeat=repeat))
+    batched = min(timeit.repeat(lambda: calc_rotation(*points), number=1, repeat=repeat))
+    return scalar, batched
+
+
+if __name__ == '__main__':
+    print('{:>8} {:>12} {:>12} {:>8}'.format('bonds', 'scalar [ms]', 'batched [ms]', 'speedup'))
+    for n in (10, 100, 1000, 10000, 100000):
+        _scalar, _batched = bench(n)
+        print('{:>8} {:>12.3f} {:>12.3f} {:>7.1f}x'.format(n, 1000 * _scalar, 1000 * _batched, _scalar / _batched))
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# the shared modules are in the directory of this script, which blender does not add to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from primitives import CUT_MODES, LOD_TOLERANCES
+
+try:
+    import bpy
+except ImportError:  # not inside blender
+    bpy = None
+
+
+BLENDER = 'blender'
+SCRIPTS_DIR = 'scripts'
+RESULTS_DIR = 'results'
+MANIFEST_FILENAME = '{}/blender_manifest.json'.format(RESULTS_DIR)
+
+
+def reset_scene():
+    """
+    starts from an empty scene, as if blender was just started, without any object.
+    """
+    from bond_builder import create_materials, reset_templates
+
+    bpy.ops.wm.read_factory_settings()
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    create_materials()
+    reset_templates()
+
+
+def build_blend(payload_filename, blend_filename, instanced=False, lod='full', cuts='live', library=None):
+    """
+    builds the bonds of a payload in a new scene, and saves it.
+    :param instanced: whether to instance shared joint templates, see bond_builder.create_bond
+    :param lod: level of detail of the meshes, see bond_builder.build_bonds
+    :param cuts: how the boolean cuts of the joints are made, see primitives.CUT_MODES
+    :param library: directory of a joint library to read the joints from, see bond_builder.create_bond
+    """
+    from bond_builder import build_bonds, load_payload
+
+    reset_scene()
+    bonds, all_constraints = load_payload(payload_filename)
+    build_bonds(bonds, all_constraints, instanced, lod, cuts, library)
+    bpy.ops.wm.save_as_mainfile(filepath=blend_filename)
+
+
+def build_all(proteins, scripts_dir=SCRIPTS_DIR, results_dir=RESULTS_DIR, manifest_filename=MANIFEST_FILENAME,
+              instanced=False, lod='full', cuts='live', library=None):
+    """
+    runs inside blender: builds the blend file of every protein, turning any failure into a manifest entry.
+    :return: the manifest
+    """
+    start = time.time()
+    os.makedirs(results_dir, exist_ok=True)
+
+    entries = []
+    for protein in proteins:
+        entry = {'protein': protein}
+        protein_start = time.time()
+        try:
+            blend_filename = os.path.abspath(os.path.join(results_dir, '{}.blend'.format(protein)))
+            build_blend(os.path.join(scripts_dir, '{}.npz'.format(protein)), blend_filename, instanced, lod, cuts,
+                        library)
+            entry['blend'] = blend_filename
+            entry['status'] = 'ok'
+        except Exception as e:
+            entry['status'] = 'failed'
+            entry['error'] = '{}: {}'.format(type(e).__name__, e)
+        entry['seconds'] = time.time() - protein_start
+        entries.append(entry)
+        print('  {protein}: {status} ({seconds:.2f}s)'.format(**entry))
+
+    manifest = {
+        'proteins': entries,
+        'succeeded': sum(entry['status'] == 'ok' for entry in entries),
+        'failed': sum(entry['status'] != 'ok' for entry in entries),
+        'seconds': time.time() - start,
+    }
+
+    with open(manifest_filename, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def run_blender(proteins, blender=BLENDER, scripts_dir=SCRIPTS_DIR, results_dir=RESULTS_DIR,
+                manifest_filename=MANIFEST_FILENAME, instanced=False, lod='full', cuts='live', library=None):
+    """
+    launches a single headless blender session that builds the blend files of all the proteins.
+    :param proteins: list of protein ids, whose payloads were generated by process.py
+    :param blender: the blender executable
+    :param instanced: whether to instance shared joint templates, see bond_builder.create_bond
+    :param lod: level of detail of the meshes, see bond_builder.build_bonds
+    :param cuts: how the boolean cuts of the joints are made, see primitives.CUT_MODES
+    :param library: directory of a joint library to read the joints from, see bond_builder.create_bond
+    :return: the manifest written by the session, with the session's total time as 'session_seconds'
+    """
+    start = time.time()
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    command = [blender, '--background', '--factory-startup', '--python', os.path.abspath(__file__), '--',
+               '--scripts-dir', os.path.abspath(scripts_dir), '--results-dir', os.path.abspath(results_dir),
+               '--manifest', os.path.abspath(manifest_filename), '--lod', lod, '--cuts', cuts]
+    command += ['--instanced'] if instanced else []
+    command += ['--library', os.path.abspath(library)] if library is not None else []
+    command += list(proteins)
+    subprocess.run(command, check=True, cwd=project_dir)
+
+    with open(manifest_filename, 'r') as f:
+        manifest = json.load(f)
+    manifest['session_seconds'] = time.time() - start
+
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('proteins', help='what proteins to build', type=str, nargs='+')
+    parser.add_argument('--blender', help='the blender executable', type=str, default=BLENDER)
+    parser.add_argument('--scripts-dir', help='where the payloads of the proteins are', type=str,
+                        default=SCRIPTS_DIR)
+    parser.add_argument('--results-dir', help='where to save the blend files', type=str, default=RESULTS_DIR)
+    parser.add_argument('--manifest', help='where to save the manifest of the run', type=str,
+                        default=MANIFEST_FILENAME)
+    parser.add_argument('--instanced', help='instance shared joint templates instead of building every joint',
+                        action='store_true')
+    parser.add_argument('--lod', help='level of detail of the meshes: preview for quick interactive work, '
+                                      'full for export', choices=sorted(LOD_TOLERANCES), default='full')
+    parser.add_argument('--cuts', help='how the boolean cuts of the joints are made: live modifiers, modifiers '
+                                       'added after all the bonds, or applied once after all the bonds',
+                        choices=CUT_MODES, default='live')
+    parser.add_argument('--library', help='read the already cut joints from a joint library in this directory, '
+                                          'and save the missing ones into it (e.g. data/.joints)', type=str,
+                        default=None)
+
+    if bpy is not None:
+        # inside blender, the arguments of this script follow '--'
+        args = parser.parse_args(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else [])
+        build_all([protein.upper() for protein in args.proteins], args.scripts_dir, args.results_dir, args.manifest,
+                  args.instanced, args.lod, args.cuts, args.library)
+    else:
+        args = parser.parse_args()
+        _manifest = run_blender([protein.upper() for protein in args.proteins], args.blender, args.scripts_dir,
+                                args.results_dir, args.manifest, args.instanced, args.lod, args.cuts,
+                                args.library)
+        print('\n{} succeeded, {} failed in {:.2f}s ({:.2f}s building, the rest starting blender). '
+              'The manifest is saved as {}.'.format(_manifest['succeeded'], _manifest['failed'],
+                                                    _manifest['session_seconds'], _manifest['seconds'],
+                                                    args.manifest))
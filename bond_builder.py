@@ -0,0 +1,509 @@
+import bpy
+import numpy as np
+
+from geometry import calc_distance, calc_rotation
+from joint_library import JOINT_STEP, joint_key, load_joint
+from joint_mesh import BAR_RADIUS, bar_ends, joint_dimensions
+from primitives import CHORD_TOLERANCE, CUT_MODES, LOD_TOLERANCES, circle_segments, sphere_resolution
+import primitives
+
+MATERIAL_COLORS = {
+    'violet': (.5, 0, 1),
+    'cyan': (1, 2, 3),
+    'white': (5, 5, 5),
+    'gold': (3, 2, 1),
+    'green': (1, 4, 2),
+}
+
+# the materials of the joints in the current blend data, by name
+MATERIALS = {}
+
+# constraint lengths are rounded to multiples of this step, so that similar joints share a template
+TEMPLATE_STEP = JOINT_STEP
+# the layer of the templates, which is not shown. only their instances are
+TEMPLATE_LAYER = 19
+
+# the templates of the current blend data: dupli groups of joints, and meshes of cylinders
+TEMPLATES = {}
+
+# the cuts of the current build that are not made yet, as (target, cutter, modifier name), see apply_cuts
+PENDING_CUTS = []
+
+
+def create_materials():
+    """
+    creates the materials of the joints. they belong to the blend data,
+    so they are created again whenever it is reset (e.g. by a new file).
+    """
+    for name, color in MATERIAL_COLORS.items():
+        material = bpy.data.materials.new("PKHG")
+        material.diffuse_color = color
+        MATERIALS[name] = material
+
+
+create_materials()
+
+
+def reset_templates():
+    """
+    forgets the templates and the pending cuts, when the blend data they belong to is reset.
+    """
+    TEMPLATES.clear()
+    PENDING_CUTS.clear()
+
+
+def groupify(named, objs):
+    groups = bpy.data.groups
+
+    # alias existing group, or generate new group and alias that
+    group = groups.get(named) or groups.new(named)
+
+    for obj in objs:
+        if obj.name not in group.objects:
+            group.objects.link(obj)
+
+    instance = bpy.data.objects.new(named, None)
+    # instance.dupli_type = 'GROUP'
+    # instance.dupli_group = group
+    bpy.context.scene.objects.link(instance)
+
+    for obj in objs:
+        obj.parent = instance
+
+    return group, instance
+
+
+def new_mesh(name, vertices, faces):
+    """
+    a mesh datablock, written in bulk instead of through the mesh operators.
+    :param vertices: (V, 3) vertices
+    :param faces: list of faces as tuples of vertex indices
+    """
+    counts = np.array([len(face) for face in faces], dtype=np.int32)
+    loops = np.array([index for face in faces for index in face], dtype=np.int32)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set('co', np.asarray(vertices, dtype=np.float32).ravel())
+    mesh.loops.add(len(loops))
+    mesh.loops.foreach_set('vertex_index', loops)
+    mesh.polygons.add(len(faces))
+    mesh.polygons.foreach_set('loop_start', np.cumsum(counts) - counts)
+    mesh.polygons.foreach_set('loop_total', counts)
+    mesh.update(calc_edges=True)
+
+    return mesh
+
+
+def add_mesh_object(name, mesh, location=(0, 0, 0), hide=False, material=None):
+    """
+    links a new object of the mesh to the scene. the object is returned directly,
+    since its name gets a suffix (e.g. '__Socket.001') when another object already has it.
+    """
+    obj = bpy.data.objects.new(name, mesh)
+    obj.location = location
+
+    if hide:
+        obj.hide = True
+        obj.hide_render = True
+
+    if material:
+        mesh.materials.append(material)
+
+    bpy.context.scene.objects.link(obj)
+    return obj
+
+
+def add_cylinder(z1, z2, radius=.2, name='Cylinder', material=None, tolerance=CHORD_TOLERANCE):
+    mesh = new_mesh(name, *primitives.cylinder(radius, z2-z1, circle_segments(radius, tolerance)))
+    return add_mesh_object(name, mesh, location=(0, 0, (z1+z2)/2), material=material)
+
+
+def add_sphere(size, location, name='Sphere', hide=False, material=None, tolerance=CHORD_TOLERANCE):
+    mesh = new_mesh(name, *primitives.uv_sphere(size, *sphere_resolution(size, tolerance)))
+    return add_mesh_object(name, mesh, location, hide, material)
+
+
+def add_cube(scale, location, name='Cube', hide=False):
+    cube = add_mesh_object(name, new_mesh(name, *primitives.cube(1)), location, hide)
+    cube.scale = scale
+
+    return cube
+
+
+def add_difference_modifier(target, subtructor, name='Modifier'):
+    modifier = target.modifiers.new(type='BOOLEAN', name=name)
+    modifier.object = subtructor
+    modifier.operation = 'DIFFERENCE'
+
+
+def defer_difference(target, subtructor, name='Modifier', cutter_only=True):
+    """
+    same as add_difference_modifier, only once apply_cuts is called.
+    :param cutter_only: whether the subtructor is a hidden cutter, which apply_cuts may merge and remove.
+                        a visible part that also cuts (e.g. the snap) is kept as it is.
+    """
+    PENDING_CUTS.append((target, subtructor, name, cutter_only))
+
+
+def root_of(obj):
+    while obj.parent is not None:
+        obj = obj.parent
+    return obj
+
+
+def local_matrix(obj, root):
+    """
+    the transformation of an object in the coordinates of its root. it is composed of the locations, rotations
+    and scales of the objects between them, which are up to date even before the scene is updated.
+    """
+    matrix = np.identity(4)
+    while obj is not None and obj != root:
+        matrix = np.array(obj.matrix_basis) @ matrix
+        obj = obj.parent
+    return matrix
+
+
+def mesh_arrays(mesh):
+    """
+    :return: (V, 3) vertices and list of faces of a mesh, read in bulk
+    """
+    vertices = np.empty(3 * len(mesh.vertices), dtype=np.float32)
+    mesh.vertices.foreach_get('co', vertices)
+    loops = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loops)
+    starts = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', starts)
+    totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', totals)
+
+    loops = loops.tolist()
+    return vertices.reshape(-1, 3), [tuple(loops[start:start + total]) for start, total in zip(starts, totals)]
+
+
+def merge_cutters(name, cutters, root):
+    """
+    merges cutters under the same root into as few hidden meshes as possible, such that the cutters merged
+    together do not overlap (by their bounding boxes), so that every merged mesh is still a set of closed shells.
+    :return: dict of every cutter to the object it is merged into
+    """
+    shapes = []
+    for cutter in cutters:
+        vertices, faces = mesh_arrays(cutter.data)
+        matrix = local_matrix(cutter, root)
+        vertices = vertices @ matrix[:3, :3].T + matrix[:3, 3]
+        shapes.append((cutter, vertices, faces, vertices.min(axis=0), vertices.max(axis=0)))
+
+    batches = []
+    for shape in shapes:
+        for batch in batches:
+            if all(np.any(shape[3] > other[4]) or np.any(other[3] > shape[4]) for other in batch):
+                batch.append(shape)
+                break
+        else:
+            batches.append([shape])
+
+    merged = {}
+    for batch in batches:
+        if len(batch) == 1:
+            merged[batch[0][0]] = batch[0][0]
+            continue
+
+        offsets = np.cumsum([0] + [len(vertices) for _, vertices, _, _, _ in batch])
+        faces = [tuple(index + offset for index in face) for (_, _, shape_faces, _, _), offset in zip(batch, offsets)
+                 for face in shape_faces]
+        mesh = new_mesh(name, np.concatenate([vertices for _, vertices, _, _, _ in batch]), faces)
+        obj = add_mesh_object(name, mesh, hide=True)
+        obj.parent = root
+        obj.layers = batch[0][0].layers
+        for cutter, _, _, _, _ in batch:
+            merged[cutter] = obj
+
+    return merged
+
+
+def remove_object(obj):
+    mesh = obj.data
+    bpy.data.objects.remove(obj, do_unlink=True)
+    if mesh is not None and mesh.users == 0:
+        bpy.data.meshes.remove(mesh)
+
+
+def apply_cuts(apply=False):
+    """
+    makes the pending cuts of a deferred build, see CUT_MODES: the hidden cutters of the same cut under the same
+    root (i.e. of the same bond) are merged, and every target gets a single boolean modifier for every merged
+    cutter. the visible parts that also cut are neither merged nor removed.
+    :param apply: whether to evaluate the modifiers once and keep only the cut meshes, without any hidden cutter
+    :return: number of boolean modifiers made
+    """
+    pending = list(PENDING_CUTS)
+    PENDING_CUTS.clear()
+
+    batches = {}
+    for target, cutter, name, cutter_only in pending:
+        root = root_of(target)
+        cutters = batches.setdefault((root, name), [])
+        if cutter_only and cutter not in cutters and root_of(cutter) == root:
+            cutters.append(cutter)
+
+    merged = {}
+    for (root, name), cutters in batches.items():
+        merged.update(merge_cutters('__Merged{}'.format(name), cutters, root))
+
+    modifiers = []
+    for target, cutter, name, _ in pending:
+        cutter = merged.get(cutter, cutter)
+        if (target, cutter) not in modifiers:
+            add_difference_modifier(target, cutter, name)
+            modifiers.append((target, cutter))
+
+    used = {cutter for _, cutter in modifiers}
+    for cutter in set(merged) - used:
+        remove_object(cutter)
+    hidden = {merged.get(cutter, cutter) for _, cutter, _, cutter_only in pending if cutter_only}
+
+    if apply:
+        bpy.context.scene.update()
+        for target in dict.fromkeys(target for target, _ in modifiers):
+            mesh = target.to_mesh(bpy.context.scene, True, 'PREVIEW')
+            old = target.data
+            target.modifiers.clear()
+            target.data = mesh
+            if old.users == 0:
+                bpy.data.meshes.remove(old)
+        for cutter in hidden:
+            remove_object(cutter)
+
+    return len(modifiers)
+
+
+def add_ball_and_socket(z, constraint_x, constraint_y, name='_BallAndSocket', prefix='', size=1.0,
+                        tolerance=CHORD_TOLERANCE, deferred=False):
+    """
+    :param tolerance: largest distance of the tessellated spheres and cylinders from the true ones,
+                      which sets their number of faces, see primitives.LOD_TOLERANCES
+    :param deferred: whether to leave the boolean cuts to apply_cuts, instead of adding their modifiers now
+    """
+    def cut(target, subtructor, name, cutter_only=True):
+        if deferred:
+            defer_difference(target, subtructor, name, cutter_only)
+        else:
+            add_difference_modifier(target, subtructor, name)
+
+    d = joint_dimensions(z, constraint_x, constraint_y, size)
+
+    socket = add_sphere(d.size_socket, d.location_socket, '__Socket', material=MATERIALS['cyan'],
+                        tolerance=tolerance)
+    ball = add_sphere(d.size_ball, d.location_ball, '__Ball', material=MATERIALS['violet'], tolerance=tolerance)
+    ball_wrapper = add_sphere(d.size_wrapper, d.location_wrapper, '__BallWrapper', hide=True, tolerance=tolerance)
+    cut(target=socket, subtructor=ball_wrapper, name='BallWrapperModifier')
+    safety = add_cylinder(d.z1_safety, d.z2_safety, d.radius_safety, '__Safety', material=MATERIALS['violet'],
+                          tolerance=tolerance)
+    constraint = add_cube(d.constraint_scale, d.location_constraint, '__Constraint', hide=True)
+    cut(target=socket, subtructor=constraint, name='ConstraintModifier')
+    snap = add_sphere(d.size_snap, d.location_snap, '__Snap', material=MATERIALS['violet'], tolerance=tolerance)
+    cut(target=ball, subtructor=snap, name='SnapModifier', cutter_only=False)
+
+    objs = (socket, ball, ball_wrapper, safety, constraint, snap)
+    _, ball_and_socket = groupify(name, objs)
+
+    return ball_and_socket, objs
+
+
+def move_to_template_layer(obj):
+    obj.layers = [layer == TEMPLATE_LAYER for layer in range(len(obj.layers))]
+
+
+def joint_template(constraint_x, constraint_y, size=1.0, step=TEMPLATE_STEP, tolerance=CHORD_TOLERANCE,
+                   deferred=False):
+    """
+    the group of a ball-and-socket at the origin, built once for every rounded constraint_x, constraint_y,
+    size and tolerance.
+    :return: the group, for dupli group instances
+    """
+    key = ('joint', round(constraint_x / step), round(constraint_y / step), size, tolerance)
+    if key not in TEMPLATES:
+        name = '_Template_{}_{}_{}_{}'.format(*key[1:])
+        ball_and_socket, objs = add_ball_and_socket(0, key[1] * step, key[2] * step, name=name, size=size,
+                                                    tolerance=tolerance, deferred=deferred)
+        for obj in (ball_and_socket,) + objs:
+            move_to_template_layer(obj)
+        TEMPLATES[key] = bpy.data.groups[name]
+
+    return TEMPLATES[key]
+
+
+def add_ball_and_socket_instance(z, constraint_x, constraint_y, name='_BallAndSocket', size=1.0,
+                                 step=TEMPLATE_STEP, tolerance=CHORD_TOLERANCE, deferred=False):
+    """
+    same as add_ball_and_socket, as an instance of a shared joint_template instead of six new objects.
+    :return: the instance, and no objects of its own
+    """
+    instance = bpy.data.objects.new(name, None)
+    instance.dupli_type = 'GROUP'
+    instance.dupli_group = joint_template(constraint_x, constraint_y, size, step, tolerance, deferred)
+    instance.location = (0, 0, z)
+    bpy.context.scene.objects.link(instance)
+
+    return instance, ()
+
+
+def add_ball_and_socket_from_library(z, constraint_x, constraint_y, name='_BallAndSocket', size=1.0,
+                                     step=TEMPLATE_STEP, tolerance=CHORD_TOLERANCE, library_dir=None):
+    """
+    same as add_ball_and_socket, from the already cut meshes of a joint library (see joint_library.load_joint),
+    without any cutter or boolean modifier. the joints of the same rounded constraints share their meshes,
+    which are read once into the blend data.
+    :return: the joint, and its socket, ball, safety and snap
+    """
+    key = ('library', library_dir) + joint_key(constraint_x, constraint_y, size, step, tolerance)
+    if key not in TEMPLATES:
+        meshes = []
+        for part, vertices, triangles in load_joint(constraint_x, constraint_y, size, step, tolerance, library_dir):
+            mesh = new_mesh('_Library_{}'.format(part), vertices, triangles)
+            mesh.materials.append(MATERIALS['cyan' if part == 'socket' else 'violet'])
+            meshes.append((part, mesh))
+        TEMPLATES[key] = meshes
+
+    objs = tuple(add_mesh_object('__{}'.format(part.capitalize()), mesh, location=(0, 0, z))
+                 for part, mesh in TEMPLATES[key])
+    _, ball_and_socket = groupify(name, objs)
+
+    return ball_and_socket, objs
+
+
+def add_cylinder_instance(z1, z2, radius=.2, name='Cylinder', material=None, tolerance=CHORD_TOLERANCE):
+    """
+    same as add_cylinder, as a linked duplicate of a shared unit cylinder of the same radius, scaled along z.
+    """
+    key = ('cylinder', radius, material.name if material else None, tolerance)
+    if key not in TEMPLATES:
+        template = add_cylinder(-.5, .5, radius, '_Template_Cylinder', material, tolerance)
+        move_to_template_layer(template)
+        TEMPLATES[key] = template.data
+
+    cylinder = bpy.data.objects.new(name, TEMPLATES[key])
+    cylinder.location = (0, 0, (z1+z2)/2)
+    cylinder.scale = (1, 1, z2-z1)
+    bpy.context.scene.objects.link(cylinder)
+
+    return cylinder
+
+
+def create_bond(length, constraints, size=1.0, name='_Bond', instanced=False, step=TEMPLATE_STEP,
+                tolerance=CHORD_TOLERANCE, deferred=False, library=None):
+    """
+    :param length: the length of the joint
+    :param constraints: itarable[Tuple] of length 3, pairs of contraint_x, constraint_y
+    :param size: size of each ball-and-socket
+    :param name: name of the joint
+    :param instanced: whether to build the joints and cylinders as instances of shared templates,
+                      which is much faster and lighter for many bonds.
+                      the constraints are then rounded to multiples of step.
+    :param step: rounding step of the constraints of the instanced joints
+    :param tolerance: largest distance of the tessellated surfaces from the true ones, see add_ball_and_socket
+    :param deferred: whether to leave the boolean cuts of the joints to apply_cuts
+    :param library: directory of a joint library to read the already cut joints from, instead of building them
+    :return: joint
+    """
+    if instanced:
+        def add_joint(z, constraint_x, constraint_y, name, size):
+            return add_ball_and_socket_instance(z, constraint_x, constraint_y, name, size, step, tolerance,
+                                                deferred)
+
+        def add_bar(z1, z2, radius, name, material):
+            return add_cylinder_instance(z1, z2, radius, name, material, tolerance)
+    else:
+        def add_joint(z, constraint_x, constraint_y, name, size):
+            return add_ball_and_socket(z, constraint_x, constraint_y, name, size=size, tolerance=tolerance,
+                                       deferred=deferred)
+
+        def add_bar(z1, z2, radius, name, material):
+            return add_cylinder(z1, z2, radius, name, material, tolerance)
+
+    if library is not None:
+        def add_joint(z, constraint_x, constraint_y, name, size):
+            return add_ball_and_socket_from_library(z, constraint_x, constraint_y, name, size, step, tolerance,
+                                                    library)
+
+    constraint_x, constraint_y = constraints[0]
+    lower_joint, lower_joint_objs = add_joint(0, constraint_x, constraint_y,
+                                              name='_LowerBallAndSocket',
+                                              size=size)
+
+    constraint_x, constraint_y = constraints[1]
+    middle_joint, middle_joint_objs = add_joint(length/2, constraint_x, constraint_y,
+                                                name='_MiddleBallAndSocket',
+                                                size=size)
+
+    constraint_x, constraint_y = constraints[2]
+    upper_joint, upper_joint_objs = add_joint(length, constraint_x, constraint_y,
+                                              name='_UpperBallAndSocket',
+                                              size=size)
+
+    (lower_z1, lower_z2), (upper_z1, upper_z2) = bar_ends(length, size)
+    lower_cylinder = add_bar(lower_z1, lower_z2,
+                             radius=BAR_RADIUS*size,
+                             name='_LowerCylinder',
+                             material=MATERIALS['gold'])
+
+    upper_cylinder = add_bar(upper_z1, upper_z2,
+                             radius=BAR_RADIUS*size,
+                             name='_UpperCylinder',
+                             material=MATERIALS['gold'])
+
+    objs = (lower_joint, middle_joint, upper_joint, lower_cylinder, upper_cylinder)
+    _, bond = groupify(name, objs)
+
+    return bond, objs
+
+
+def place_bond(obj, x1, y1, z1, x2, y2, z2):
+    phi, theta = calc_rotation(x1, y1, z1, x2, y2, z2)
+
+    obj.location = (x1, y1, z1)
+    obj.rotation_euler[1] = theta
+    obj.rotation_euler[2] = phi
+
+
+def load_payload(filename):
+    """
+    reads the bonds of a protein, as saved by process.py next to its blender script.
+    :return: (n, 2, 3) coordinates of the ends of the bonds, and (n, 3, 2) constraint lengths of their joints
+    """
+    with np.load(filename) as payload:
+        return payload['bonds'].astype(float), payload['constraints'].astype(float)
+
+
+def build_bonds(bonds, all_constraints, instanced=False, lod='full', cuts='live', library=None):
+    """
+    creates and places the joints of all the bonds.
+    :param bonds: (n, 2, 3) coordinates of the ends of the bonds
+    :param all_constraints: (n, 3, 2) constraint lengths of the lower, middle and upper joints of every bond
+    :param instanced: whether to instance shared joint templates, see create_bond
+    :param lod: level of detail of the meshes, 'preview' for quick interactive work or 'full' for export,
+                see primitives.LOD_TOLERANCES
+    :param cuts: how the boolean cuts of the joints are made, see CUT_MODES
+    :param library: directory of a joint library to read the already cut joints from, see create_bond
+    :return: list of the bonds' objects
+    """
+    if cuts not in CUT_MODES:
+        raise ValueError('unknown cuts {}, expected one of {}'.format(cuts, ', '.join(CUT_MODES)))
+    tolerance = LOD_TOLERANCES[lod]
+    deferred = cuts != 'live'
+    starts, ends = bonds[:, 0], bonds[:, 1]
+    lengths = calc_distance(*starts.T, *ends.T)
+
+    built = []
+    for (x1, y1, z1), (x2, y2, z2), length, constraints in zip(starts.tolist(), ends.tolist(), lengths.tolist(),
+                                                                all_constraints.tolist()):
+        bond, _ = create_bond(length, constraints, instanced=instanced, tolerance=tolerance, deferred=deferred,
+                              library=library)
+        place_bond(bond, x1, y1, z1, x2, y2, z2)
+        built.append(bond)
+
+    if deferred:
+        apply_cuts(apply=cuts == 'applied')
+
+    return built
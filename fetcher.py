@@ -0,0 +1,186 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import os
+import queue
+import shutil
+import threading
+
+from pdb_reader import find_structure
+
+
+# where the pdb files are fetched from: a base url, or a local mirror directory
+SOURCE = 'https://files.rcsb.org/download'
+CACHE_DIR = 'data/.fetched'
+
+# number of files fetched at once
+CONNECTIONS = 8
+CHUNK_SIZE = 2 ** 16
+
+
+def source_names(protein):
+    """
+    the names a pdb file may have in a source, tried in order:
+    the rcsb download names, and the wwpdb mirror names (flat, or divided by the middle letters of the id).
+    """
+    lower = protein.lower()
+    return ['{}.pdb.gz'.format(protein.upper()), '{}.pdb'.format(protein.upper()),
+            '{}/pdb{}.ent.gz'.format(lower[1:3], lower), 'pdb{}.ent.gz'.format(lower), 'pdb{}.ent'.format(lower)]
+
+
+def open_source(source, name):
+    """
+    :return: a binary stream of the named file in the source, or None if the source has no such file
+    """
+    if '://' not in source:
+        path = os.path.join(source, name)
+        return open(path, 'rb') if os.path.isfile(path) else None
+
+    try:
+        return urlopen('{}/{}'.format(source.rstrip('/'), name), timeout=60)
+    except HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+
+def object_path(cache_dir, content_hash):
+    return os.path.join(cache_dir, 'objects', content_hash[:2], '{}.pdb'.format(content_hash))
+
+
+def store_object(cache_dir, stream):
+    """
+    copies a stream into the cache, under the hash of its content, without holding it all in memory.
+    :return: the hash of the content
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    partial = os.path.join(cache_dir, 'partial.{}.{}'.format(os.getpid(), threading.get_ident()))
+
+    content_hash = hashlib.sha1()
+    with open(partial, 'wb') as f:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            content_hash.update(chunk)
+            f.write(chunk)
+    content_hash = content_hash.hexdigest()
+
+    path = object_path(cache_dir, content_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(partial, path)
+    return content_hash
+
+
+def fetch_pdb(protein, source=SOURCE, cache_dir=CACHE_DIR):
+    """
+    fetches a pdb file into a content addressed cache: every file is kept once under the hash of its content,
+    and the protein id refers to its hash. gzip files are decompressed while they are read.
+    :param protein: protein id
+    :param source: base url, or local mirror directory
+    :param cache_dir: directory of the cache
+    :return: path of the cached pdb file
+    """
+    protein = protein.upper()
+    ref = os.path.join(cache_dir, 'ids', protein)
+    if os.path.isfile(ref):
+        with open(ref, 'r') as f:
+            path = object_path(cache_dir, f.read().strip())
+        if os.path.isfile(path):
+            return path
+
+    for name in source_names(protein):
+        stream = open_source(source, name)
+        if stream is None:
+            continue
+
+        with stream:
+            if name.endswith('.gz'):
+                with gzip.GzipFile(fileobj=stream) as decompressed:
+                    content_hash = store_object(cache_dir, decompressed)
+            else:
+                content_hash = store_object(cache_dir, stream)
+
+        os.makedirs(os.path.dirname(ref), exist_ok=True)
+        partial_ref = '{}.{}.{}'.format(ref, os.getpid(), threading.get_ident())
+        with open(partial_ref, 'w') as f:
+            f.write(content_hash)
+        os.replace(partial_ref, ref)
+        return object_path(cache_dir, content_hash)
+
+    raise FileNotFoundError('no pdb file of {} in {}'.format(protein, source))
+
+
+def install_pdb(protein, data_dir, source=SOURCE, cache_dir=CACHE_DIR):
+    """
+    makes sure that data_dir has a structure file of a protein (see pdb_reader.find_structure),
+    fetching it as <id>.pdb if needed.
+    :return: path of the structure file
+    """
+    existing = find_structure(data_dir, protein.upper())
+    if existing:
+        return existing
+
+    filename = os.path.join(data_dir, '{}.pdb'.format(protein.upper()))
+    path = fetch_pdb(protein, source, cache_dir)
+    partial = '{}.{}.{}'.format(filename, os.getpid(), threading.get_ident())
+    # a copy, not a link, so that editing the structure in data_dir cannot change the cached object
+    shutil.copyfile(path, partial)
+    os.replace(partial, filename)
+    return filename
+
+
+async def fetch_all(proteins, data_dir, source=SOURCE, cache_dir=CACHE_DIR, connections=CONNECTIONS):
+    """
+    installs the pdb files of many proteins concurrently, at most connections at a time.
+    :return: async iterator of (protein, error or None), in the order the fetches finish
+    """
+    semaphore = asyncio.Semaphore(connections)
+    loop = asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(connections) as executor:
+        async def fetch(protein):
+            async with semaphore:
+                try:
+                    await loop.run_in_executor(executor, install_pdb, protein, data_dir, source, cache_dir)
+                    return protein, None
+                except Exception as e:
+                    return protein, e
+
+        for done in asyncio.as_completed([fetch(protein) for protein in proteins]):
+            yield await done
+
+
+def prefetch(proteins, data_dir, source=SOURCE, cache_dir=CACHE_DIR, connections=CONNECTIONS):
+    """
+    fetches the pdb files of many proteins in a background thread, so that the caller can process every protein
+    as soon as its file is there, while the others are still downloading.
+    :return: iterator of (protein, error or None), in the order the fetches finish
+    """
+    fetched = queue.Queue()
+
+    async def run():
+        async for result in fetch_all(proteins, data_dir, source, cache_dir, connections):
+            fetched.put(result)
+
+    threading.Thread(target=asyncio.run, args=(run(),), daemon=True).start()
+    for _ in range(len(proteins)):
+        yield fetched.get()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('proteins', help='what proteins to fetch', type=str, nargs='+')
+    parser.add_argument('--data-dir', help='where to install the pdb files', type=str, default='data')
+    parser.add_argument('--source', help='base url, or local mirror directory', type=str, default=SOURCE)
+    parser.add_argument('--cache-dir', help='content addressed cache of the fetched files', type=str,
+                        default=CACHE_DIR)
+    parser.add_argument('--connections', help='number of files fetched at once', type=int, default=CONNECTIONS)
+
+    args = parser.parse_args()
+
+    for _protein, _error in prefetch([protein.upper() for protein in args.proteins], args.data_dir, args.source,
+                                     args.cache_dir, args.connections):
+        print('{}: {}'.format(_protein, 'failed ({})'.format(_error) if _error else 'ok'))
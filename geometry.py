@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def calc_distance(x1, y1, z1, x2, y2, z2):
+    """
+    the distances between the points (x1, y1, z1) and (x2, y2, z2).
+    every coordinate may be a number or an array, and they are broadcast together.
+    """
+    vx, vy, vz = np.subtract(x2, x1), np.subtract(y2, y1), np.subtract(z2, z1)
+    return np.sqrt(vx * vx + vy * vy + vz * vz)
+
+
+def calc_direction(x1, y1, z1, x2, y2, z2):
+    """
+    the unit vectors from the points (x1, y1, z1) to the points (x2, y2, z2), or zero vectors where they coincide.
+    :return: vx, vy, vz
+    """
+    vx, vy, vz = np.subtract(x2, x1), np.subtract(y2, y1), np.subtract(z2, z1)
+    length = np.sqrt(vx * vx + vy * vy + vz * vz)
+
+    # coincident points have a zero vector, which stays zero when divided by 1
+    length = np.where(length > 0, length, 1)
+    return vx / length, vy / length, vz / length
+
+
+def calc_rotation(x1, y1, z1, x2, y2, z2):
+    """
+    the directions of the vectors from the points (x1, y1, z1) to the points (x2, y2, z2), as spherical angles:
+    phi around the z axis and theta from it. coincident points point up the z axis, (0, 0).
+    :return: phi, theta
+    """
+    vx, vy, vz = np.subtract(x2, x1), np.subtract(y2, y1), np.subtract(z2, z1)
+    distance = np.sqrt(vx * vx + vy * vy + vz * vz)
+
+    phi = np.arctan2(vy, vx)
+    cos_theta = np.where(distance > 0, vz / np.where(distance > 0, distance, 1), 1)
+    theta = np.arccos(np.clip(cos_theta, -1, 1))
+
+    return phi, theta
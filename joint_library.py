@@ -0,0 +1,96 @@
+import argparse
+import os
+import threading
+
+import numpy as np
+
+from joint_mesh import joint_meshes
+from primitives import CHORD_TOLERANCE, LOD_TOLERANCES
+
+
+LIBRARY_DIR = 'data/.joints'
+# sizes and constraint lengths are rounded to multiples of this step, so that similar joints share their meshes
+JOINT_STEP = 0.005
+
+# the joints already read in this process, by library directory and key
+LOADED = {}
+
+
+def joint_key(constraint_x, constraint_y, size=1.0, step=JOINT_STEP, tolerance=CHORD_TOLERANCE):
+    """
+    :return: the rounded size, constraint_x and constraint_y of a joint, in steps, and its tolerance
+    """
+    return round(size / step), round(constraint_x / step), round(constraint_y / step), tolerance
+
+
+def joint_filename(library_dir, key):
+    return os.path.join(library_dir, 'joint_s{}_x{}_y{}_t{:g}.npz'.format(*key))
+
+
+def load_joint(constraint_x, constraint_y, size=1.0, step=JOINT_STEP, tolerance=CHORD_TOLERANCE,
+               library_dir=LIBRARY_DIR):
+    """
+    the cut meshes of a ball-and-socket at the origin (see joint_mesh.joint_meshes), of the rounded size and
+    constraint lengths. they are read from the library, or made and saved into it the first time they are needed.
+    :return: list of (name, vertices, triangles)
+    """
+    key = joint_key(constraint_x, constraint_y, size, step, tolerance)
+    if (library_dir, key) in LOADED:
+        return LOADED[library_dir, key]
+
+    filename = joint_filename(library_dir, key)
+    if os.path.isfile(filename):
+        with np.load(filename) as saved:
+            meshes = [(name, saved['{}_vertices'.format(name)], saved['{}_triangles'.format(name)])
+                      for name in saved['names'].tolist()]
+    else:
+        size, constraint_x, constraint_y = key[0] * step, key[1] * step, key[2] * step
+        meshes = [(name, vertices.astype(np.float32), triangles.astype(np.int32))
+                  for name, vertices, triangles in joint_meshes(0, constraint_x, constraint_y, size, tolerance)]
+
+        arrays = {'names': np.array([name for name, _, _ in meshes])}
+        for name, vertices, triangles in meshes:
+            arrays['{}_vertices'.format(name)] = vertices
+            arrays['{}_triangles'.format(name)] = triangles
+
+        # written aside and moved into place, so that concurrent builds never read a partial file
+        os.makedirs(library_dir, exist_ok=True)
+        partial = '{}.{}.{}'.format(filename, os.getpid(), threading.get_ident())
+        with open(partial, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(partial, filename)
+
+    LOADED[library_dir, key] = meshes
+    return meshes
+
+
+def fill_library(all_constraints, size=1.0, step=JOINT_STEP, tolerance=CHORD_TOLERANCE, library_dir=LIBRARY_DIR):
+    """
+    makes sure that the library has the joints of the given constraint lengths.
+    :param all_constraints: (..., 2) constraint_x, constraint_y of the joints
+    :return: number of distinct joints, and how many of them were already in the library
+    """
+    keys = {joint_key(constraint_x, constraint_y, size, step, tolerance)
+            for constraint_x, constraint_y in np.asarray(all_constraints).reshape(-1, 2).tolist()}
+    existing = sum(os.path.isfile(joint_filename(library_dir, key)) for key in keys)
+    for key in keys:
+        load_joint(key[1] * step, key[2] * step, key[0] * step, step, tolerance, library_dir)
+
+    return len(keys), existing
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('proteins', help='what proteins to make the joints of, from their payloads in the scripts '
+                                         'directory', type=str, nargs='+')
+    parser.add_argument('--library', help='directory of the joint library', type=str, default=LIBRARY_DIR)
+    parser.add_argument('--lod', help='level of detail of the meshes', choices=sorted(LOD_TOLERANCES),
+                        default='full')
+
+    args = parser.parse_args()
+
+    for _protein in [protein.upper() for protein in args.proteins]:
+        with np.load(os.path.join('scripts', '{}.npz'.format(_protein))) as payload:
+            _joints, _existing = fill_library(payload['constraints'], tolerance=LOD_TOLERANCES[args.lod],
+                                              library_dir=args.library)
+        print('{}: {} joints, {} of them already in the library.'.format(_protein, _joints, _existing))
@@ -0,0 +1,354 @@
+from collections import namedtuple
+
+import numpy as np
+import argparse
+import os
+import warnings
+
+from geometry import calc_distance, calc_rotation
+from mesh_export import EXPORT_FORMATS, write_mesh
+from primitives import CHORD_TOLERANCE, LOD_TOLERANCES, circle_segments, sphere_resolution
+
+
+# the dimensions of a ball-and-socket joint, see joint_dimensions
+JointDimensions = namedtuple('JointDimensions', (
+    'size_socket', 'size_ball', 'size_wrapper', 'size_snap', 'radius_safety',
+    'location_socket', 'location_ball', 'location_wrapper', 'location_snap', 'location_constraint',
+    'z1_safety', 'z2_safety', 'constraint_scale'))
+
+# the cylinders between the joints of a bond overlap the sockets by this much, times the size
+BAR_OVERLAP = 0.01
+BAR_RADIUS = 0.2
+
+# angles of a revolved surface closer than this (in radians) are merged
+ANGLE_EPSILON = 1e-9
+
+RESULTS_DIR = 'results'
+
+
+def joint_dimensions(z, constraint_x, constraint_y, size=1.0):
+    """
+    the dimensions of the parts of a ball-and-socket joint, shared by bond_builder.add_ball_and_socket
+    and by the meshes of joint_meshes.
+    the spheres' sizes are radii, and the constraint box spans constraint_scale on each side of its location.
+    """
+    size_socket = size
+    size_ball = .95 * size
+    size_wrapper = (size_socket + size_ball) / 2
+    size_snap = .1 * size
+    radius_safety = .02 * size
+
+    socket_ball_diff = size_socket - size_ball
+    socket_wrapper_diff = size_socket - size_ball
+    snap_diff = (size_socket + size_ball) / 2 - 0.95 * size_snap
+
+    z_socket = z
+    z_ball = z_socket + socket_ball_diff
+    z_wrapper = z_socket + socket_wrapper_diff
+    y_snap = snap_diff
+
+    ball_bottom = z_ball - size_ball
+    socket_bottom = z_socket - size_socket
+    z_ball_socket_middle = (ball_bottom + socket_bottom) / 2
+    z1_safety = z_ball_socket_middle
+    z2_safety = ball_bottom
+    length_safety = z2_safety - z1_safety
+
+    constraint_depth = 1.1 * length_safety
+    constraint_scale = (constraint_x, constraint_y, constraint_depth)
+
+    return JointDimensions(size_socket, size_ball, size_wrapper, size_snap, radius_safety,
+                           location_socket=(0, 0, z_socket), location_ball=(0, 0, z_ball),
+                           location_wrapper=(0, 0, z_wrapper), location_snap=(0, y_snap, z_socket),
+                           location_constraint=(0, 0, ball_bottom),
+                           z1_safety=z1_safety, z2_safety=z2_safety, constraint_scale=constraint_scale)
+
+
+def bar_ends(length, size=1.0):
+    """
+    the (z1, z2) ends of the lower and the upper cylinders of a bond, between its joints.
+    """
+    z1, z2, z3 = 0, length/2, length
+    eps = BAR_OVERLAP * size
+    return (z1+size-eps, z2-size+eps), (z2+size-eps, z3-size+eps)
+
+
+def arc(center, radius, start, end, segments):
+    """
+    points of an arc of a circle centered on the axis, in the (rho, h) half plane of a profile.
+    :param center: height of the center of the circle
+    :param start: polar angle of the first point, from the bottom of the circle
+    :param end: polar angle of the last point
+    :param segments: number of segments of the whole circle
+    :return: (P, 2) points, including both ends
+    """
+    count = max(1, int(np.ceil(abs(end - start) / (2 * np.pi / segments) - 1e-9)))
+    alpha = np.linspace(start, end, count + 1)
+    return np.stack((radius * np.sin(alpha), center - radius * np.cos(alpha)), axis=-1)
+
+
+def revolve(profile, angles):
+    """
+    revolves the points of a profile around the z axis.
+    :param profile: (P, 2) points (rho, h)
+    :param angles: angles of the revolved copies of every point
+    :return: list of rings of 3d points, a single point for every point on the axis
+    """
+    rings = []
+    for rho, h in np.asarray(profile).tolist():
+        if rho <= 1e-12:
+            rings.append(np.array([[0, 0, h]], dtype=float))
+        else:
+            rings.append(np.stack((rho * np.cos(angles), rho * np.sin(angles), np.full(len(angles), h)), axis=-1))
+
+    return rings
+
+
+def loft(rings):
+    """
+    a closed triangle mesh through consecutive rings of points, starting and ending with single points.
+    every ring runs counter-clockwise around the axis of the mesh, and the rings run counter-clockwise
+    around the solid in its profile, so that the triangles face outwards.
+    :param rings: list of (N, 3) rings of the same N points, or (1, 3) single points
+    :return: (V, 3) vertices and (T, 3) triangles
+    """
+    offsets = np.cumsum([0] + [len(ring) for ring in rings])
+    n = max(len(ring) for ring in rings)
+    k, k1 = np.arange(n), (np.arange(n) + 1) % n
+
+    triangles = []
+    for i in range(len(rings) - 1):
+        lower, upper = len(rings[i]) > 1, len(rings[i + 1]) > 1
+        a = offsets[i] + (k if lower else 0)
+        b = offsets[i] + (k1 if lower else 0)
+        c = offsets[i + 1] + (k1 if upper else 0)
+        d = offsets[i + 1] + (k if upper else 0)
+        if lower:
+            triangles.append(np.stack(np.broadcast_arrays(a, b, c), axis=-1))
+        if upper:
+            triangles.append(np.stack(np.broadcast_arrays(a, c, d), axis=-1))
+
+    return np.concatenate(rings), np.concatenate(triangles)
+
+
+def join_profiles(*profiles):
+    """
+    concatenates profiles whose every one starts where the previous one ends.
+    """
+    return np.concatenate([profiles[0]] + [profile[1:] for profile in profiles[1:]])
+
+
+def sphere_mesh(center, radius, tolerance=CHORD_TOLERANCE):
+    segments, _ = sphere_resolution(radius, tolerance)
+    angles = 2 * np.pi * np.arange(segments) / segments
+    vertices, triangles = loft(revolve(arc(0, radius, 0, np.pi, segments), angles))
+    return vertices + center, triangles
+
+
+def cylinder_mesh(z1, z2, radius, tolerance=CHORD_TOLERANCE):
+    segments = circle_segments(radius, tolerance)
+    angles = 2 * np.pi * np.arange(segments) / segments
+    profile = [(0, z1), (radius, z1), (radius, z2), (0, z2)]
+    return loft(revolve(profile, angles))
+
+
+def intersection(center1, radius1, center2, radius2):
+    """
+    the circle where two spheres centered on the axis meet.
+    :return: its height and radius
+    """
+    h = (center1 + center2) / 2 + (radius1 ** 2 - radius2 ** 2) / (2 * (center2 - center1))
+    return h, np.sqrt(radius1 ** 2 - (h - center1) ** 2)
+
+
+def socket_mesh(dimensions, tolerance=CHORD_TOLERANCE):
+    """
+    the socket of a joint: its sphere without the ball wrapper, which opens the socket at the top,
+    and without the constraint box, which leaves a rectangular pocket in the bottom of the cup.
+    every surface is exact, except that the spheres are tessellated.
+    """
+    zs, rs = dimensions.location_socket[2], dimensions.size_socket
+    zw, rw = dimensions.location_wrapper[2], dimensions.size_wrapper
+    (segments, _), (wrapper_segments, _) = sphere_resolution(rs, tolerance), sphere_resolution(rw, tolerance)
+    zb = dimensions.location_constraint[2]
+    half_x, half_y, half_depth = dimensions.constraint_scale
+    floor, top = zb - half_depth, zb + half_depth
+    if not zw - rw > floor:
+        raise ValueError('the constraint box is deeper than the bottom of the socket')
+
+    # a wider pocket would cut through the bottom of the socket, or rise above the cup, which the revolved
+    # surfaces cannot follow. it is narrowed to fit instead, keeping its proportions
+    largest = .99 * min(np.sqrt(rs ** 2 - (zs - floor) ** 2), np.sqrt(rw ** 2 - (zw - top) ** 2))
+    if np.hypot(half_x, half_y) > largest:
+        scale = largest / np.hypot(half_x, half_y)
+        warnings.warn('the constraint box of the joint at z={:.3g} ({:.3g} x {:.3g}) cuts through its socket, '
+                      'and is narrowed to {:.3g} x {:.3g} in its mesh'.format(
+                          zs, 2 * half_x, 2 * half_y, 2 * scale * half_x, 2 * scale * half_y))
+        half_x, half_y = scale * half_x, scale * half_y
+
+    # the corners of the pocket are among the angles, so that its walls meet in sharp corners.
+    # they replace the angles of the segments that they (nearly) fall on, which would leave sliver triangles
+    corners = np.arctan2([half_y, half_y, -half_y, -half_y], [half_x, -half_x, -half_x, half_x]) % (2 * np.pi)
+    angles = 2 * np.pi * np.arange(segments) / segments
+    gaps = np.abs((angles[:, None] - corners + np.pi) % (2 * np.pi) - np.pi).min(axis=1)
+    angles = np.unique(np.concatenate((angles[gaps > ANGLE_EPSILON], corners)))
+    # distance of the pocket's walls from the axis, at every angle
+    walls = np.minimum(half_x / np.maximum(np.abs(np.cos(angles)), 1e-12),
+                       half_y / np.maximum(np.abs(np.sin(angles)), 1e-12))
+
+    diagonal = np.hypot(half_x, half_y)
+    rim_h, rim_rho = intersection(zs, rs, zw, rw)
+
+    # the cup is revolved down to a circle around the pocket, and continues inwards to the pocket's walls
+    # as a height field of the wrapper
+    cap_rho = min(2 * diagonal, (diagonal + rw) / 2)
+    outer = arc(zs, rs, 0, np.arctan2(rim_rho, zs - rim_h), segments)
+    inner = arc(zw, rw, np.arctan2(rim_rho, zw - rim_h), np.arcsin(cap_rho / rw), wrapper_segments)
+    rings_3d = revolve(join_profiles(outer, inner), angles)
+
+    steps = max(1, int(np.ceil((cap_rho - diagonal) / (rw * 2 * np.pi / wrapper_segments))))
+    directions = np.stack((np.cos(angles), np.sin(angles)), axis=-1)
+    for t in np.linspace(1, 0, steps + 1)[1:]:
+        rho = walls + (cap_rho - walls) * t
+        rings_3d.append(np.column_stack((rho[:, None] * directions, zw - np.sqrt(rw ** 2 - rho ** 2))))
+
+    rings_3d.append(np.column_stack((walls[:, None] * directions, np.full(len(angles), floor))))
+    rings_3d.append(np.array([[0, 0, floor]], dtype=float))
+
+    return loft(rings_3d)
+
+
+def ball_mesh(dimensions, tolerance=CHORD_TOLERANCE):
+    """
+    the ball of a joint, without the snap: a dimple where the snap sphere meets the ball.
+    it is revolved around the axis through the centers of the ball and of the snap.
+    """
+    center, radius = np.array(dimensions.location_ball, dtype=float), dimensions.size_ball
+    snap, snap_radius = np.array(dimensions.location_snap, dtype=float), dimensions.size_snap
+    distance = calc_distance(*center, *snap)
+    if not radius - snap_radius < distance < radius + snap_radius:
+        return sphere_mesh(center, radius, tolerance)
+
+    axis = (snap - center) / distance
+    e1 = np.cross(axis, [1, 0, 0] if abs(axis[0]) < .9 else [0, 1, 0])
+    e1 /= np.linalg.norm(e1)
+    e2 = np.cross(axis, e1)
+
+    h, rho = intersection(0, radius, distance, snap_radius)
+    segments, _ = sphere_resolution(radius, tolerance)
+    profile = join_profiles(arc(0, radius, 0, np.arctan2(rho, -h), segments),
+                            arc(distance, snap_radius, np.arctan2(rho, distance - h), 0,
+                                sphere_resolution(snap_radius, tolerance)[0]))
+    vertices, triangles = loft(revolve(profile, 2 * np.pi * np.arange(segments) / segments))
+
+    return center + vertices @ np.stack((e1, e2, axis)), triangles
+
+
+def joint_meshes(z, constraint_x, constraint_y, size=1.0, tolerance=CHORD_TOLERANCE):
+    """
+    the printed parts of a ball-and-socket joint, as add_ball_and_socket builds them in blender.
+    the ball wrapper and the constraint box only cut the other parts, and are not printed.
+    :param tolerance: largest distance of the tessellated surfaces from the true ones, see primitives.LOD_TOLERANCES
+    :return: list of (name, vertices, triangles)
+    """
+    dimensions = joint_dimensions(z, constraint_x, constraint_y, size)
+    return [
+        ('socket', *socket_mesh(dimensions, tolerance)),
+        ('ball', *ball_mesh(dimensions, tolerance)),
+        ('safety', *cylinder_mesh(dimensions.z1_safety, dimensions.z2_safety, dimensions.radius_safety, tolerance)),
+        ('snap', *sphere_mesh(dimensions.location_snap, dimensions.size_snap, tolerance)),
+    ]
+
+
+def bond_meshes(length, constraints, size=1.0, tolerance=CHORD_TOLERANCE, library=None):
+    """
+    the printed parts of a bond along the z axis, as create_bond builds them in blender.
+    :param constraints: constraint_x, constraint_y of the lower, middle and upper joints
+    :param library: directory of a joint library to read the joints from, see joint_library.load_joint.
+                    they are made at the origin and moved to their joints, with their constraints rounded.
+    :return: list of (name, vertices, triangles)
+    """
+    if library is not None:
+        from joint_library import JOINT_STEP, load_joint
+
+        def joint_parts(z, constraint_x, constraint_y):
+            return [(name, vertices + (0, 0, z), triangles) for name, vertices, triangles in
+                    load_joint(constraint_x, constraint_y, size, JOINT_STEP, tolerance, library)]
+    else:
+        def joint_parts(z, constraint_x, constraint_y):
+            return joint_meshes(z, constraint_x, constraint_y, size, tolerance)
+
+    meshes = []
+    for joint, z, (constraint_x, constraint_y) in zip(('lower', 'middle', 'upper'), (0, length/2, length),
+                                                       constraints):
+        meshes += [('{}_{}'.format(joint, name), vertices, triangles)
+                   for name, vertices, triangles in joint_parts(z, constraint_x, constraint_y)]
+
+    for name, (z1, z2) in zip(('lower_cylinder', 'upper_cylinder'), bar_ends(length, size)):
+        meshes.append((name, *cylinder_mesh(z1, z2, BAR_RADIUS * size, tolerance)))
+
+    return meshes
+
+
+def place(vertices, x1, y1, z1, x2, y2, z2):
+    """
+    moves vertices along the z axis onto the bond from (x1, y1, z1) to (x2, y2, z2), like place_bond:
+    rotated by theta around the y axis and then by phi around the z axis, and moved to (x1, y1, z1).
+    """
+    phi, theta = calc_rotation(x1, y1, z1, x2, y2, z2)
+    rotation_y = np.array([[np.cos(theta), 0, np.sin(theta)], [0, 1, 0], [-np.sin(theta), 0, np.cos(theta)]])
+    rotation_z = np.array([[np.cos(phi), -np.sin(phi), 0], [np.sin(phi), np.cos(phi), 0], [0, 0, 1]])
+
+    return vertices @ (rotation_z @ rotation_y).T + (x1, y1, z1)
+
+
+def protein_meshes(bonds, all_constraints, size=1.0, tolerance=CHORD_TOLERANCE, library=None):
+    """
+    the printed parts of all the bonds of a protein, placed on the bonds, one bond at a time.
+    :param bonds: (n, 2, 3) coordinates of the ends of the bonds
+    :param all_constraints: (n, 3, 2) constraint lengths of the joints of every bond
+    :param library: directory of a joint library, see bond_meshes
+    :return: iterator of (name, vertices, triangles)
+    """
+    for b, (((x1, y1, z1), (x2, y2, z2)), constraints) in enumerate(zip(np.asarray(bonds).tolist(),
+                                                                         np.asarray(all_constraints).tolist())):
+        length = calc_distance(x1, y1, z1, x2, y2, z2)
+        for name, vertices, triangles in bond_meshes(length, constraints, size, tolerance, library):
+            yield 'bond{}_{}'.format(b, name), place(vertices, x1, y1, z1, x2, y2, z2), triangles
+
+
+def export_protein(payload_filename, output_filename, output_format='stl', tolerance=CHORD_TOLERANCE,
+                   library=None):
+    """
+    writes the printed parts of a protein's bonds, as saved by process.py, into a print file.
+    """
+    with np.load(payload_filename) as payload:
+        bonds, all_constraints = payload['bonds'].astype(float), payload['constraints'].astype(float)
+
+    return write_mesh(output_filename, protein_meshes(bonds, all_constraints, tolerance=tolerance, library=library),
+                      output_format)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('protein', help='what protein to export, from its payload in the scripts directory', type=str)
+    parser.add_argument('--format', help='format of the print file', choices=EXPORT_FORMATS, default='stl')
+    parser.add_argument('--output', help='the print file (default: results/<protein id>.<format>)', type=str,
+                        default=None)
+    parser.add_argument('--lod', help='level of detail of the meshes: preview for quick checks, full for printing',
+                        choices=sorted(LOD_TOLERANCES), default='full')
+    parser.add_argument('--tolerance', help='largest distance of the meshes from the true surfaces, '
+                                            'e.g. the resolution of the printer (default: by --lod)',
+                        type=float, default=None)
+    parser.add_argument('--library', help='read the joints from a joint library in this directory, and save the '
+                                          'missing ones into it (e.g. data/.joints)', type=str, default=None)
+
+    args = parser.parse_args()
+
+    _protein = args.protein.upper()
+    _output = args.output or os.path.join(RESULTS_DIR, '{}.{}'.format(_protein, args.format))
+    os.makedirs(os.path.dirname(_output) or '.', exist_ok=True)
+    _tolerance = args.tolerance or LOD_TOLERANCES[args.lod]
+    _triangles = export_protein(os.path.join('scripts', '{}.npz'.format(_protein)), _output, args.format,
+                                _tolerance, args.library)
+    print('{} triangles of protein {} saved as {}.'.format(_triangles, _protein, _output))
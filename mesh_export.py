@@ -0,0 +1,96 @@
+import zipfile
+
+import numpy as np
+
+
+EXPORT_FORMATS = ('stl', '3mf')
+
+# a triangle of a binary stl file: its normal, its vertices and an unused attribute
+STL_DTYPE = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+STL_HEADER_SIZE = 80
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
+</Types>
+"""
+RELATIONSHIPS = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>
+</Relationships>
+"""
+MODEL_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<model unit="{}" xml:lang="en-US" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">
+<resources>
+"""
+
+
+def write_stl(filename, meshes):
+    """
+    streams meshes into a binary stl file, one mesh at a time.
+    :param meshes: iterable of (name, (V, 3) vertices, (T, 3) triangles)
+    :return: number of triangles
+    """
+    count = 0
+    with open(filename, 'wb') as f:
+        f.write(b'\0' * STL_HEADER_SIZE + np.uint32(0).tobytes())
+        for _, vertices, triangles in meshes:
+            corners = np.asarray(vertices)[np.asarray(triangles)]
+            normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+            normals /= np.maximum(np.linalg.norm(normals, axis=-1, keepdims=True), 1e-30)
+
+            records = np.zeros(len(corners), dtype=STL_DTYPE)
+            records['normal'], records['vertices'] = normals, corners
+            f.write(records.tobytes())
+            count += len(records)
+
+        # the number of triangles is only known at the end
+        f.seek(STL_HEADER_SIZE)
+        f.write(np.uint32(count).tobytes())
+
+    return count
+
+
+def write_3mf(filename, meshes, unit='millimeter'):
+    """
+    streams meshes into a 3mf package, one object for every mesh.
+    :param meshes: iterable of (name, (V, 3) vertices, (T, 3) triangles)
+    :param unit: unit of the coordinates
+    :return: number of triangles
+    """
+    count = 0
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', CONTENT_TYPES)
+        archive.writestr('_rels/.rels', RELATIONSHIPS)
+
+        with archive.open('3D/3dmodel.model', 'w') as f:
+            f.write(MODEL_HEADER.format(unit).encode())
+            object_id = 0
+            for object_id, (name, vertices, triangles) in enumerate(meshes, 1):
+                f.write('<object id="{}" name="{}" type="model"><mesh>\n<vertices>\n'.format(object_id, name).encode())
+                f.write(''.join('<vertex x="{:.6g}" y="{:.6g}" z="{:.6g}"/>\n'.format(*vertex)
+                                for vertex in np.asarray(vertices).tolist()).encode())
+                f.write(b'</vertices>\n<triangles>\n')
+                f.write(''.join('<triangle v1="{}" v2="{}" v3="{}"/>\n'.format(*triangle)
+                                for triangle in np.asarray(triangles).tolist()).encode())
+                f.write(b'</triangles>\n</mesh></object>\n')
+                count += len(triangles)
+
+            f.write(b'</resources>\n<build>\n')
+            f.write(''.join('<item objectid="{}"/>\n'.format(i) for i in range(1, object_id + 1)).encode())
+            f.write(b'</build>\n</model>\n')
+
+    return count
+
+
+def write_mesh(filename, meshes, output_format='stl'):
+    """
+    streams meshes into a print file of the given format, see EXPORT_FORMATS.
+    :return: number of triangles
+    """
+    if output_format == 'stl':
+        return write_stl(filename, meshes)
+    if output_format == '3mf':
+        return write_3mf(filename, meshes)
+    raise ValueError('unknown format {}, expected one of {}'.format(output_format, ', '.join(EXPORT_FORMATS)))
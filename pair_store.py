@@ -0,0 +1,61 @@
+import numpy as np
+import hashlib
+import json
+import sqlite3
+
+
+# bump when the stored bonds change meaning, to invalidate old stores
+STORE_VERSION = 1
+
+# scoring options that change the scored bonds. the others (search, max_block_mb, jobs) only change how fast they are found
+RESULT_OPTIONS = ('top_k', 'separation', 'aggregate')
+DEFAULT_OPTIONS = {'top_k': 1, 'separation': 0, 'aggregate': 'max'}
+
+
+def chain_hash(stack):
+    """
+    a hash of the coordinates of a chain in all its scored conformations.
+    """
+    stack = np.ascontiguousarray(stack, dtype=float)
+    return hashlib.sha1(repr(stack.shape).encode() + stack.tobytes()).hexdigest()
+
+
+class PairStore:
+    """
+    a persistent store of the scored bonds of pairs of chains, keyed by the hashes of the chains' coordinates.
+    after a chain is edited, only the pairs involving it miss the store and need to be scored again.
+    """
+
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename, timeout=60)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS pair_scores ('
+                                'chain_a TEXT, chain_b TEXT, options TEXT, bonds TEXT, '
+                                'PRIMARY KEY (chain_a, chain_b, options))')
+
+    @staticmethod
+    def options_key(search_options):
+        options = {name: search_options.get(name, DEFAULT_OPTIONS[name]) for name in RESULT_OPTIONS}
+        return json.dumps([STORE_VERSION, options], sort_keys=True)
+
+    def get(self, chain_hashes, options):
+        """
+        :param chain_hashes: list of (hash of chain a, hash of chain b)
+        :param options: options_key of the scoring options
+        :return: list of the stored bonds of every pair, or None for the missing pairs
+        """
+        bonds = []
+        for chain_a, chain_b in chain_hashes:
+            row = self.connection.execute('SELECT bonds FROM pair_scores WHERE chain_a = ? AND chain_b = ? '
+                                          'AND options = ?', (chain_a, chain_b, options)).fetchone()
+            bonds.append(None if row is None else [tuple(bond) for bond in json.loads(row[0])])
+
+        return bonds
+
+    def put(self, chain_hashes, options, bonds):
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO pair_scores VALUES (?, ?, ?, ?)',
+                                        [(chain_a, chain_b, options, json.dumps(pair_bonds))
+                                         for (chain_a, chain_b), pair_bonds in zip(chain_hashes, bonds)])
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,399 @@
+from collections import deque, namedtuple
+
+import numpy as np
+import gzip
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import re
+
+
+# chains of some models of a pdb file.
+# n_models is the number of models in the file, stacks[c] is a (K, N, 3) array of the N atoms of chain c
+# in each of the K read models, and residue_ids[c] lists their (hetflag, resseq, icode), as in Bio.PDB.
+PDBChains = namedtuple('PDBChains', ('n_models', 'chain_ids', 'residue_ids', 'stacks'))
+
+ATOM_RECORDS = (b'ATOM  ', b'HETATM')
+WATER_NAMES = (b'HOH', b'WAT')
+
+# the structure files that can be read, in order of preference
+STRUCTURE_EXTENSIONS = ('.pdb', '.pdb.gz', '.cif', '.cif.gz')
+
+CIF_TOKEN = re.compile(rb"""'(.*?)'(?=\s|$)|"(.*?)"(?=\s|$)|(\S+)""")
+CIF_LOOP_END = (b'#', b'loop_', b'_', b'data_')
+CIF_UNASSIGNED = (b'?', b'.')
+
+# bump when the cached arrays change meaning, to invalidate old caches
+CACHE_VERSION = 1
+RESIDUE_ID_DTYPE = [('hetflag', 'U10'), ('resseq', 'i8'), ('icode', 'U1')]
+
+
+def is_cif(filename):
+    return filename.endswith(('.cif', '.cif.gz'))
+
+
+def open_text(filename):
+    """
+    opens a structure file as text, decompressing a .gz file while it is read.
+    """
+    return gzip.open(filename, 'rt') if filename.endswith('.gz') else open(filename, 'r')
+
+
+def find_structure(data_dir, protein):
+    """
+    :return: the structure file of a protein in data_dir, in any of STRUCTURE_EXTENSIONS, or None
+    """
+    for extension in STRUCTURE_EXTENSIONS:
+        filename = os.path.join(data_dir, '{}{}'.format(protein, extension))
+        if os.path.isfile(filename):
+            return filename
+
+    return None
+
+
+def split_models(lines):
+    """
+    groups the lines of a pdb file by model, looking only at the record names, one model at a time.
+    the lines before the first MODEL record are dropped, unless there are no MODEL records at all.
+    :return: iterator of lists of lines
+    """
+    model, has_models = [], False
+    for line in lines:
+        if line.startswith(b'MODEL'):
+            if has_models:
+                yield model
+            model, has_models = [], True
+        model.append(line)
+
+    yield model
+
+
+def select_models(chunks, models):
+    """
+    picks some of the models of a stream of models, holding only the picked ones
+    and as many of the last ones as the negative indices need.
+    :param chunks: iterator of the models
+    :param models: indices of the models to pick (negative indices count from the last model), or None for all
+    :return: number of models, and the picked models in the order of models
+    """
+    if models is None:
+        chunks = list(chunks)
+        return len(chunks), chunks
+
+    wanted = {model for model in models if model >= 0}
+    recent = deque(maxlen=max([-model for model in models if model < 0], default=0))
+    kept, n = {}, 0
+    for chunk in chunks:
+        if n in wanted:
+            kept[n] = chunk
+        if recent.maxlen:
+            recent.append(chunk)
+        n += 1
+
+    for index, chunk in enumerate(recent, n - len(recent)):
+        kept.setdefault(index, chunk)
+
+    indices = [model if model >= 0 else n + model for model in models]
+    if any(index not in kept for index in indices):
+        raise IndexError('model index out of range: {} models in the file'.format(n))
+    return n, [kept[index] for index in indices]
+
+
+def read_model_lines(filename, models):
+    """
+    reads the lines of some models of a pdb file.
+    a plain file is memory mapped, and only the picked models are split into lines.
+    a .gz file is decompressed while it is read, a line at a time.
+    :return: number of models, and the lines of every picked model
+    """
+    if filename.endswith('.gz'):
+        with gzip.open(filename, 'rb') as f:
+            return select_models(split_models(line.rstrip(b'\r\n') for line in f), models)
+
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        starts = [0] if mapped[:5] == b'MODEL' else []
+        start = mapped.find(b'\nMODEL')
+        while start != -1:
+            starts.append(start + 1)
+            start = mapped.find(b'\nMODEL', start + 1)
+        starts = starts or [0]
+        ranges = list(zip(starts, starts[1:] + [len(mapped)]))
+        if models is None:
+            models = range(len(ranges))
+        return len(ranges), [mapped[slice(*ranges[model])].splitlines() for model in models]
+
+
+def parse_model(lines, atom_name):
+    """
+    parses the atoms named atom_name of a single model, straight from the fixed columns of its records.
+    like Bio.PDB, an atom with alternate locations is taken at its highest occupancy (the first one on ties).
+    :return: dict of chain id to dict of residue id to (occupancy, x, y, z), in order of appearance.
+             chains without such atoms are kept empty, like Bio.PDB keeps them.
+    """
+    chains = {}
+    for line in lines:
+        if line[:6] not in ATOM_RECORDS:
+            continue
+
+        residues = chains.setdefault(line[21:22].decode(), {})
+        if line[12:16].strip() != atom_name:
+            continue
+
+        resname = line[17:20].strip()
+        if line[:6] == b'ATOM  ':
+            hetflag = ' '
+        elif resname in WATER_NAMES:
+            hetflag = 'W'
+        else:
+            hetflag = 'H_' + resname.decode()
+        residue_id = (hetflag, int(line[22:26]), line[26:27].decode().strip() or ' ')
+        occupancy = float(line[54:60].strip() or 0)
+
+        if residue_id not in residues or occupancy > residues[residue_id][0]:
+            residues[residue_id] = (occupancy, line[30:38], line[38:46], line[46:54])
+
+    return chains
+
+
+def cif_tokens(line):
+    if b"'" not in line and b'"' not in line:
+        return line.split()
+    return [next(group for group in match.groups() if group is not None) for match in CIF_TOKEN.finditer(line)]
+
+
+def cif_atom_site(lines):
+    """
+    finds the _atom_site loop of an mmcif file.
+    :return: dict of column name to index, and an iterator of the rows of the loop, as lists of tokens
+    """
+    lines = iter(lines)
+    columns = {}
+    for line in lines:
+        if line.startswith(b'_atom_site.'):
+            columns[line.split()[0][len(b'_atom_site.'):].decode()] = len(columns)
+        elif columns:
+            rows = itertools.takewhile(lambda row: not row.startswith(CIF_LOOP_END), itertools.chain([line], lines))
+            return columns, (cif_tokens(row) for row in rows if row.strip())
+
+    return columns, iter(())
+
+
+def split_cif_models(rows, column):
+    """
+    groups the rows of the _atom_site loop by model, starting a model whenever the model number changes, like Bio.PDB.
+    """
+    if column is None:
+        yield list(rows)
+        return
+
+    model, number = [], None
+    for row in rows:
+        if row[column] != number:
+            if model:
+                yield model
+            model, number = [], row[column]
+        model.append(row)
+
+    yield model
+
+
+def parse_cif_model(rows, columns, atom_name):
+    """
+    same as parse_model, for the rows of the _atom_site loop of an mmcif file.
+    the names and numbers are taken from the same columns as Bio.PDB.MMCIFParser takes them.
+    """
+    group, atom, resname, chain = (columns[name] for name in ('group_PDB', 'label_atom_id', 'label_comp_id',
+                                                              'auth_asym_id'))
+    resseq = columns['auth_seq_id'] if 'auth_seq_id' in columns else columns['label_seq_id']
+    icode, occupancy = columns['pdbx_PDB_ins_code'], columns['occupancy']
+    x, y, z = columns['Cartn_x'], columns['Cartn_y'], columns['Cartn_z']
+
+    chains = {}
+    for row in rows:
+        residues = chains.setdefault(row[chain].decode(), {})
+        if row[atom] != atom_name:
+            continue
+
+        if row[group] != b'HETATM':
+            hetflag = ' '
+        elif row[resname] in WATER_NAMES:
+            hetflag = 'W'
+        else:
+            hetflag = 'H_' + row[resname].decode()
+        residue_id = (hetflag, int(row[resseq]), ' ' if row[icode] in CIF_UNASSIGNED else row[icode].decode())
+        atom_occupancy = 0.0 if row[occupancy] in CIF_UNASSIGNED else float(row[occupancy])
+
+        if residue_id not in residues or atom_occupancy > residues[residue_id][0]:
+            residues[residue_id] = (atom_occupancy, row[x], row[y], row[z])
+
+    return chains
+
+
+def read_cif(filename, models=(0, -1), atom_name='CA'):
+    """
+    same as read_pdb, for an mmcif file (.cif or .cif.gz), reading only its _atom_site loop.
+    """
+    opener = gzip.open if filename.endswith('.gz') else open
+    with opener(filename, 'rb') as f:
+        columns, rows = cif_atom_site(f)
+        if not columns:
+            raise ValueError('no _atom_site loop in {}'.format(filename))
+        n_models, chosen = select_models(split_cif_models(rows, columns.get('pdbx_PDB_model_num')), models)
+
+    atom_name = atom_name.encode()
+    return build_chains(n_models, [parse_cif_model(rows, columns, atom_name) for rows in chosen])
+
+
+def read_pdb(filename, models=(0, -1), atom_name='CA'):
+    """
+    a lightweight alternative to Bio.PDB.PDBParser, reading only the coordinates of some atoms of some models.
+    the models in between are skipped without being parsed.
+    mmcif files are read by read_cif.
+    :param filename: pdb file, mmcif file, or either of them compressed by gzip
+    :param models: indices of the models to read (negative indices count from the last model), or None for all
+    :param atom_name: name of the atom to read from every residue
+    :return: PDBChains
+    """
+    if is_cif(filename):
+        return read_cif(filename, models, atom_name)
+
+    n_models, chosen = read_model_lines(filename, models)
+    atom_name = atom_name.encode()
+    return build_chains(n_models, [parse_model(lines, atom_name) for lines in chosen])
+
+
+def build_chains(n_models, parsed):
+    """
+    :param n_models: number of models in the file
+    :param parsed: parsed chains of every read model, see parse_model
+    :return: PDBChains
+    """
+    chain_ids = list(parsed[0])
+    models_chains = [list(chains.values()) for chains in parsed]
+    residue_ids = [list(residues) for residues in models_chains[0]]
+    for chains in models_chains[1:]:
+        assert len(chains) == len(chain_ids)
+        for residues, first_residues in zip(chains, residue_ids):
+            assert len(residues) == len(first_residues)
+
+    stacks = []
+    for c in range(len(chain_ids)):
+        coordinates = [[atom[1:] for atom in chains[c].values()] for chains in models_chains]
+        # Bio.PDB keeps coordinates in single precision
+        stack = np.array(coordinates, dtype=np.float32).astype(float).reshape(len(parsed), -1, 3)
+        stacks.append(stack)
+
+    return PDBChains(n_models, chain_ids, residue_ids, stacks)
+
+
+def read_pdb_biopython(filename, models=(0, -1), atom_name='CA'):
+    """
+    same as read_pdb, through the whole Bio.PDB structure (of Bio.PDB.MMCIFParser for mmcif files).
+    """
+    # imported here, so that the fast reader does not load all of Bio.PDB
+    from Bio.PDB import MMCIFParser, PDBParser
+
+    parser = MMCIFParser() if is_cif(filename) else PDBParser()
+    with open_text(filename) as f:
+        structure_models = list(parser.get_structure('PROTEIN', f))
+    if models is None:
+        models = range(len(structure_models))
+    chosen = [structure_models[model] for model in models]
+
+    chain_ids = [chain.id for chain in chosen[0]]
+    residue_ids = [[residue.id for residue in chain if atom_name in residue] for chain in chosen[0]]
+
+    models_chains = []
+    for model in chosen:
+        chains = [np.array([residue[atom_name].get_coord() for residue in chain if atom_name in residue],
+                           dtype=float).reshape(-1, 3)
+                  for chain in model]
+        assert len(chains) == len(chain_ids)
+        for coordinates, residues in zip(chains, residue_ids):
+            assert len(coordinates) == len(residues)
+        models_chains.append(chains)
+
+    stacks = [np.stack(chains) for chains in zip(*models_chains)]
+    return PDBChains(len(structure_models), chain_ids, residue_ids, stacks)
+
+
+READERS = {
+    'biopython': read_pdb_biopython,
+    'fast': read_pdb,
+}
+
+
+def file_hash(filename):
+    """
+    a hash of the content of a file, read in chunks so that a huge file is not held in memory.
+    """
+    content_hash = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(2 ** 20), b''):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def load_pdb(filename, reader='biopython', models=(0, -1), atom_name='CA', cache=False):
+    """
+    reads the chains of a pdb file, optionally through a cache of the parsed arrays.
+    the cache is a directory next to the pdb file, keyed by the content of the file and by the parser options.
+    its arrays are memory mapped, so a warm load does not parse the pdb file at all.
+    :param filename: structure file, see read_pdb
+    :param reader: a key of READERS
+    :param models: indices of the models to read, or None for all
+    :param atom_name: name of the atom to read from every residue
+    :param cache: whether to use the cache
+    :return: PDBChains
+    """
+    if not cache:
+        return READERS[reader](filename, models, atom_name)
+
+    content_hash = file_hash(filename)
+    options = (CACHE_VERSION, reader, None if models is None else tuple(models), atom_name)
+    key = hashlib.sha1('{} {}'.format(content_hash, options).encode()).hexdigest()[:16]
+    cache_dir = os.path.join('{}.cache'.format(filename), key)
+
+    if not os.path.isdir(cache_dir):
+        save_cache(cache_dir, READERS[reader](filename, models, atom_name))
+    return read_cache(cache_dir)
+
+
+def save_cache(cache_dir, pdb):
+    # written aside and renamed, so concurrent runs never see a partial cache
+    partial_dir = '{}.{}.partial'.format(cache_dir, os.getpid())
+    os.makedirs(partial_dir)
+
+    offsets = np.cumsum([0] + [len(residues) for residues in pdb.residue_ids])
+    coordinates = np.concatenate(pdb.stacks, axis=1) if pdb.stacks else np.zeros((0, 0, 3))
+    residue_ids = np.array([tuple(residue_id) for residues in pdb.residue_ids for residue_id in residues],
+                           dtype=RESIDUE_ID_DTYPE)
+
+    np.save(os.path.join(partial_dir, 'coordinates.npy'), coordinates)
+    np.save(os.path.join(partial_dir, 'offsets.npy'), offsets)
+    np.save(os.path.join(partial_dir, 'residue_ids.npy'), residue_ids)
+    with open(os.path.join(partial_dir, 'info.json'), 'w') as f:
+        json.dump({'n_models': pdb.n_models, 'chain_ids': pdb.chain_ids}, f)
+
+    try:
+        os.rename(partial_dir, cache_dir)
+    except OSError:  # another run has just cached the same file
+        for name in os.listdir(partial_dir):
+            os.remove(os.path.join(partial_dir, name))
+        os.rmdir(partial_dir)
+
+
+def read_cache(cache_dir):
+    with open(os.path.join(cache_dir, 'info.json'), 'r') as f:
+        info = json.load(f)
+
+    coordinates = np.load(os.path.join(cache_dir, 'coordinates.npy'), mmap_mode='r')
+    offsets = np.load(os.path.join(cache_dir, 'offsets.npy'))
+    residue_ids = np.load(os.path.join(cache_dir, 'residue_ids.npy'), mmap_mode='r')
+
+    bounds = list(zip(offsets, offsets[1:]))
+    stacks = [coordinates[:, start:end] for start, end in bounds]
+    residue_ids = [residue_ids[start:end] for start, end in bounds]
+    return PDBChains(info['n_models'], info['chain_ids'], residue_ids, stacks)
@@ -0,0 +1,97 @@
+import numpy as np
+
+
+# resolution of blender's default primitives
+SPHERE_SEGMENTS = 32
+SPHERE_RINGS = 16
+CYLINDER_VERTICES = 32
+
+# the largest distance between a tessellated surface and the true one, in the units of the model,
+# for quick previews and for the final models
+LOD_TOLERANCES = {
+    'preview': 0.1,
+    'full': 0.01,
+}
+CHORD_TOLERANCE = LOD_TOLERANCES['full']
+MIN_SEGMENTS = 6
+MAX_SEGMENTS = 256
+
+# how the boolean cuts of the joints are made in blender, see bond_builder.build_bonds:
+# live: a modifier for every cut as soon as the joint is built, evaluated on every update of the scene.
+# deferred: the cuts are made after all the bonds are built, by a single modifier for every merged cutter,
+#           which is evaluated once the scene is updated, or only when it is exported.
+# applied: the same, and the modifiers are then applied once, leaving only the cut meshes.
+CUT_MODES = ('live', 'deferred', 'applied')
+
+
+def circle_segments(radius, tolerance=CHORD_TOLERANCE):
+    """
+    the number of segments of a circle, such that its chords are at most tolerance away from it:
+    radius * (1 - cos(pi / segments)) <= tolerance.
+    it is even, so that a sphere of as many segments has whole rings.
+    """
+    if tolerance >= radius:
+        return MIN_SEGMENTS
+
+    segments = int(np.ceil(np.pi / np.arccos(1 - tolerance / radius)))
+    return int(np.clip(segments + segments % 2, MIN_SEGMENTS, MAX_SEGMENTS))
+
+
+def sphere_resolution(radius, tolerance=CHORD_TOLERANCE):
+    """
+    :return: segments and rings of a uv sphere, whose faces are at most tolerance away from the sphere
+    """
+    # the middle of a face is about as far from the sphere as the middles of its edges in both directions
+    segments = circle_segments(radius, tolerance / 2)
+    return segments, segments // 2
+
+
+def uv_sphere(radius=1.0, segments=SPHERE_SEGMENTS, rings=SPHERE_RINGS):
+    """
+    the mesh of a uv sphere around the origin, like bpy.ops.mesh.primitive_uv_sphere_add.
+    :return: (V, 3) vertices, and list of faces as tuples of vertex indices, counter-clockwise seen from outside
+    """
+    theta = np.pi * np.arange(1, rings) / rings
+    phi = 2 * np.pi * np.arange(segments) / segments
+    ring = np.stack((np.outer(np.sin(theta), np.cos(phi)), np.outer(np.sin(theta), np.sin(phi)),
+                     np.repeat(np.cos(theta)[:, None], segments, axis=1)), axis=-1).reshape(-1, 3)
+    vertices = radius * np.concatenate(([[0, 0, 1]], ring, [[0, 0, -1]]))
+
+    # the rings are numbered from the top, after the top pole
+    bottom = len(vertices) - 1
+    index = (1 + np.arange(rings - 1)[:, None] * segments + np.arange(segments)).tolist()
+    faces = [(0, index[0][s], index[0][(s + 1) % segments]) for s in range(segments)]
+    for r in range(rings - 2):
+        faces += [(index[r][s], index[r + 1][s], index[r + 1][(s + 1) % segments], index[r][(s + 1) % segments])
+                  for s in range(segments)]
+    faces += [(bottom, index[-1][(s + 1) % segments], index[-1][s]) for s in range(segments)]
+
+    return vertices, faces
+
+
+def cylinder(radius=1.0, depth=2.0, vertices=CYLINDER_VERTICES):
+    """
+    the mesh of a cylinder around the z axis, centered at the origin, like bpy.ops.mesh.primitive_cylinder_add.
+    :return: (V, 3) vertices, and list of faces as tuples of vertex indices, counter-clockwise seen from outside
+    """
+    phi = 2 * np.pi * np.arange(vertices) / vertices
+    circle = np.stack((radius * np.cos(phi), radius * np.sin(phi)), axis=-1)
+    points = np.concatenate((np.insert(circle, 2, -depth / 2, axis=1), np.insert(circle, 2, depth / 2, axis=1)))
+
+    faces = [(s, (s + 1) % vertices, vertices + (s + 1) % vertices, vertices + s) for s in range(vertices)]
+    faces.append(tuple(range(vertices - 1, -1, -1)))
+    faces.append(tuple(range(vertices, 2 * vertices)))
+
+    return points, faces
+
+
+def cube(radius=1.0):
+    """
+    the mesh of a cube centered at the origin, like bpy.ops.mesh.primitive_cube_add.
+    :param radius: half of the edge of the cube
+    :return: (8, 3) vertices, and list of faces as tuples of vertex indices, counter-clockwise seen from outside
+    """
+    vertices = radius * np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], dtype=float)
+    faces = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+
+    return vertices, faces
@@ -1,48 +1,84 @@
-from Bio.PDB import *
 from scipy.sparse.csgraph import minimum_spanning_tree
+from collections import namedtuple
 
 import numpy as np
-import math
 import argparse
 import os
+import time
+
+from scoring import MAX_BLOCK_MB, SEARCHES, check_aggregate, stack_chains, score_pairs
+from pdb_reader import READERS, file_hash, load_pdb
+from pair_store import PairStore
+from result_store import ResultStore
+from fetcher import SOURCE, install_pdb
+from geometry import calc_rotation
+from spanning import MST_BACKENDS, NEIGHBOURS, chain_centroids, chain_spheres, lazy_kruskal, lower_bounds, \
+    neighbour_pairs, sparse_mst
 
 
 SCRIPT_SKELETON_FILENAME = 'script_skeleton.txt'
 DATA_DIR = 'data'
 SCRIPTS_DIR = 'scripts'
 
+# the joints of every bond, from its end on the first chain to its end on the second chain
+JOINTS = ('lower', 'middle', 'upper')
 
-def parse_chains(pdbfilename):
-    parser = PDBParser()
-    structure = parser.get_structure('PROTEIN', pdbfilename)
+# the geometry of the joints of B bonds:
+# coordinates0, coordinates1 - (B, 2, 3) arrays of the bonds' ends in the first and second conformations
+# angles - (B, 3, 2) array of the (phi, theta) changes of every joint (see JOINTS) between the conformations
+# constraints - (B, 3, 2) array of the (x, y) lengths of every joint's constraint box
+JointGeometry = namedtuple('JointGeometry', ('coordinates0', 'coordinates1', 'angles', 'constraints'))
 
-    chains0, chains1 = [], []
 
-    models = list(structure)
-    assert len(models) > 1, "There is only one conformation for this protein. Please provide a pdb with at least two."
-    assert len(list(models[0].get_chains())) > 1, "There is only one chain in this protein, so no joints are needed."
+def parse_chains(pdbfilename, reader='biopython', cache=False):
+    """
+    reads the alpha carbons of every chain, in the first and the last model of a pdb file.
+    :param pdbfilename: pdb or mmcif file, optionally compressed by gzip (.pdb, .pdb.gz, .cif, .cif.gz)
+    :param reader: 'biopython' builds the whole Bio.PDB structure, 'fast' reads only the needed records
+    :param cache: whether to reuse the parsed coordinates of a previous run
+    :return: chains0, chains1 - lists of (N, 3) coordinates arrays of the chains in both conformations
+    """
+    stacks = parse_conformations(pdbfilename, reader, cache, models=(0, -1))
 
-    for model, chains in zip((models[0], models[-1]), (chains0, chains1)):
-        for chain in model:
-            chains.append([])
-            for residue in chain:
-                if 'CA' in residue:  # residue is amino-acid (aa)
-                    vector = residue['CA'].get_vector()
-                    chains[-1].append(vector)
+    chains0 = [stack[0] for stack in stacks]
+    chains1 = [stack[1] for stack in stacks]
+    return chains0, chains1
 
-    assert len(chains0) == len(chains1)
-    for (x0, x1) in zip(chains0, chains1):
-        assert len(x0) == len(x1)
 
-    return chains0, chains1
+def parse_conformations(pdbfilename, reader='biopython', cache=False, models=None):
+    """
+    reads the alpha carbons of every chain, in some models of a pdb file.
+    :param models: indices of the models (negative indices count from the last model), or None for all
+    :return: list of (K, N, 3) coordinates arrays of the chains in the K models
+    """
+    pdb = load_pdb(pdbfilename, reader, models=models, atom_name='CA', cache=cache)
+
+    assert pdb.n_models > 1, "There is only one conformation for this protein. Please provide a pdb with at least two."
+    assert len(pdb.stacks) > 1, "There is only one chain in this protein, so no joints are needed."
+    assert len(pdb.stacks[0]) > 1, "At least two models are needed to score the bonds."
+
+    return pdb.stacks
 
 
-def build_mst(chains0, chains1):
+def parse_models(text):
+    """
+    parses the --models argument: comma separated model indices, or 'all'.
+    """
+    if text == 'all':
+        return None
+    return tuple(int(model) for model in text.split(','))
+
+
+def build_mst(chains0, chains1, stacks=None, return_candidates=False, **scoring_options):
     """
     finds the minimum spanning tree of a structure, represented by a list of chains.
     the nodes are the chains, and the minimal distance between two atoms in pair of chains is an edge.
     :param chains0:
     :param chains1:
+    :param stacks: (K, N, 3) coordinates of the chains in all the conformations to score, if more than chains0 and chains1
+    :param return_candidates: whether to also return the ranked candidate bonds of every pair of chains
+    :param scoring_options: passed to scoring.score_pairs (jobs, store, top_k, separation, search, max_block_mb,
+                            aggregate)
     :return: mst as array
     """
     n = len(chains0)
@@ -51,36 +87,105 @@ def build_mst(chains0, chains1):
     # nodes[a][b] is the index of the atom in the b'th chain which the edge from a'th chain is connected to.
     nodes = -np.ones((n,n))
 
-    for a, (x0a, x1a) in enumerate(zip(chains0, chains1)):
-        for b, (x0b, x1b) in enumerate(zip(chains0, chains1)):
-            s = t = 0
-            min_distance = float('inf')
-            for i, (x0ia, x1ia) in enumerate(zip(x0a, x1a)):
-                for j, (x0jb, x1jb), in enumerate(zip(x0b, x1b)):
-                    distance = abs((x0ia - x0jb).norm() - (x1ia - x1jb).norm()) + (x0ia - x0jb).norm()
-                    if distance < min_distance:
-                        min_distance = distance
-                        s, t = i, j
-
-            graph[a][b] = graph[b][a] = min_distance
-            nodes[a][b] = t
-            nodes[b][a] = s
+    if stacks is None:
+        stacks = stack_chains(chains0, chains1)
+    pairs = [(a, b) for a in range(n) for b in range(a)]
+
+    # candidates[a, b] (for a > b) are the cheapest bonds of the pair, as (cost, index in a, index in b)
+    candidates = dict(zip(pairs, score_pairs(stacks, pairs, **scoring_options)))
+    for (a, b), bonds in candidates.items():
+        min_distance, s, t = bonds[0]
+        graph[a][b] = graph[b][a] = min_distance
+        nodes[a][b] = t
+        nodes[b][a] = s
 
     mst = minimum_spanning_tree(graph)
+    if return_candidates:
+        return mst.toarray().astype(float), nodes.astype(int), candidates
     return mst.toarray().astype(float), nodes.astype(int)
 
 
-def find_virtualbonds(chains0, chains1):
+def build_sparse_mst(stacks, pairs, prefilter=False, jobs=1, **scoring_options):
+    """
+    finds the minimum spanning tree of the chains over the given pairs of chains only.
+    memory and time grow with the number of pairs, instead of with the square of the number of chains.
+    :param stacks: (K, N, 3) coordinates of the chains
+    :param pairs: list of (a, b) pairs of chains, a > b
+    :param prefilter: whether to score only the pairs that the tree may still need, by the lower bounds of their
+                      costs from the chains' bounding spheres (see spanning.lazy_kruskal).
+                      a pair of chains that are far apart is never scored.
+    :param jobs: number of processes scoring the pairs
+    :param scoring_options: passed to scoring.score_pairs
+    :return: sorted list of the (a, b) edges of the tree (a < b),
+             and the candidates of the scored pairs (as in build_mst)
+    """
+    candidates = {}
+    if prefilter:
+        def score(batch):
+            candidates.update(zip(batch, score_pairs(stacks, batch, jobs, **scoring_options)))
+            return [candidates[pair][0][0] for pair in batch]
+
+        bounds = lower_bounds(chain_spheres(stacks), pairs, scoring_options.get('aggregate', 'max'))
+        edges, _ = lazy_kruskal(len(stacks), pairs, bounds, score, batch_size=max(1, jobs))
+        return edges, candidates
+
+    candidates.update(zip(pairs, score_pairs(stacks, pairs, jobs, **scoring_options)))
+    edges = sparse_mst(len(stacks), pairs, [candidates[pair][0][0] for pair in pairs])
+    return edges, candidates
+
+
+def find_virtualbonds(chains0, chains1, stacks=None, return_candidates=False, mst_backend='dense',
+                      neighbours=NEIGHBOURS, prefilter=False, stats=None, **scoring_options):
+    """
+    :param return_candidates: whether to also return the ranked alternatives of every bond
+    :param mst_backend: 'dense' scores every pair of chains, 'sparse' only the pairs of chains whose centroids are
+                        near neighbours (see spanning.neighbour_pairs)
+    :param neighbours: number of nearest chains paired with every chain by the sparse backend
+    :param prefilter: whether to skip the pairs of chains whose bounding spheres show they cannot be in the tree
+    :param stats: a dict that receives the number of candidate pairs of chains, and of the scored ones
+    :return: bonds, as (chain a, index in a, chain b, index in b).
+             with return_candidates, also a list of the alternatives of every bond, as (bond, cost) cheapest first
+             (the first is the bond itself), for falling back without scoring again.
+    """
     n = len(chains0)
-    mst, nodes = build_mst(chains0, chains1)
+    if mst_backend == 'sparse' or prefilter:
+        if stacks is None:
+            stacks = stack_chains(chains0, chains1)
+        if mst_backend == 'sparse':
+            pairs = neighbour_pairs(chain_centroids(stacks), neighbours)
+        else:
+            pairs = [(a, b) for a in range(n) for b in range(a)]
+        edges, candidates = build_sparse_mst(stacks, pairs, prefilter, **scoring_options)
+
+        bonds = []
+        for a, b in edges:
+            _, j, i = candidates[b, a][0]
+            bonds.append((a, i, b, j))
+    else:
+        pairs = n * (n - 1) // 2
+        mst, nodes, candidates = build_mst(chains0, chains1, stacks, return_candidates=True, **scoring_options)
 
-    bonds = []
-    for a in range(n):
-        for b in range(n):
-            if mst[a][b] > 0:
-                bonds.append((a, nodes[b][a], b, nodes[a][b]))
+        bonds = []
+        for a in range(n):
+            for b in range(n):
+                if mst[a][b] > 0:
+                    bonds.append((a, nodes[b][a], b, nodes[a][b]))
 
-    return bonds
+    if stats is not None:
+        stats['pairs'] = pairs if isinstance(pairs, int) else len(pairs)
+        stats['scored_pairs'] = len(candidates)
+
+    if not return_candidates:
+        return bonds
+
+    alternatives = []
+    for a, _, b, _ in bonds:
+        if a > b:
+            alternatives.append([((a, i, b, j), cost) for cost, i, j in candidates[a, b]])
+        else:
+            alternatives.append([((a, j, b, i), cost) for cost, i, j in candidates[b, a]])
+
+    return bonds, alternatives
 
 
 def get_coordinates(chains0, bonds):
@@ -88,114 +193,226 @@ def get_coordinates(chains0, bonds):
 
 
 def format_coordinates(coordinates):
-    return [(tuple(u), tuple(v)) for u, v in coordinates]
+    return [(tuple(u), tuple(v)) for u, v in np.asarray(coordinates, dtype=float).tolist()]
 
 
-def calc_rotation(x1, y1, z1, x2, y2, z2):
-    vx, vy, vz = x2 - x1, y2 - y1, z2 - z1
-    distance = math.sqrt(vx * vx + vy * vy + vz * vz)
+def calc_rotations(p, q):
+    """
+    the directions of the vectors from the points p to the points q, as spherical angles.
+    :param p: (..., 3) points
+    :param q: (..., 3) points
+    :return: (..., 2) array of (phi, theta)
+    """
+    phi, theta = calc_rotation(*np.moveaxis(p, -1, 0), *np.moveaxis(q, -1, 0))
+    return np.stack((phi, theta), axis=-1)
 
-    phi = math.atan2(vy, vx)
-    theta = math.acos(vz / distance)
 
-    return phi, theta
+def get_joint_geometry(chains0, chains1, bonds, pin_length=0.05, pin_radius=0.02):
+    """
+    computes the movement of the joints of all the bonds at once.
+    the lower and upper joints follow the direction of the first and second chain around the bond's ends,
+    and the middle joint follows the direction of the bond's second end from its middle (in the first conformation).
+    :param chains0: list of (N, 3) coordinates arrays of the chains in the first conformation
+    :param chains1: list of (N, 3) coordinates arrays of the chains in the second conformation
+    :param bonds: list of (chain a, index in a, chain b, index in b)
+    :param pin_length: length of the joints' safety pins
+    :param pin_radius: radius of the joints' safety pins
+    :return: JointGeometry
+    """
+    offsets = np.cumsum([0] + [len(chain) for chain in chains0])
+    atoms0, atoms1 = np.concatenate(chains0), np.concatenate(chains1)
 
+    bonds = np.array(bonds, dtype=int).reshape(-1, 4)
+    chain, index = bonds[:, [0, 2]], bonds[:, [1, 3]]
 
-def get_chain_angle_constraints(chain, bond, first_chain=True):
-    index_in_bond = 1 if first_chain else 3
-    res = []
-    curr = chain[0][bond[index_in_bond]]
-    curr2 = chain[1][bond[index_in_bond]]
-    if bond[index_in_bond] == len(chain[0]) - 1:
-        next = chain[0][bond[index_in_bond] - 1]
-        next2 = chain[1][bond[index_in_bond] - 1]
-    else:
-        next = chain[0][bond[index_in_bond] + 1]
-        next2 = chain[1][bond[index_in_bond] + 1]
-    first_conf_angles = calc_rotation(curr[0], curr[1], curr[2],
-                                      next[0], next[1], next[2])
-    second_conf_angles = calc_rotation(curr2[0], curr2[1], curr2[2],
-                                       next2[0], next2[1], next2[2])
-    if first_chain:
-        res.append([angle_a - angle_b for angle_a, angle_b in zip(first_conf_angles, second_conf_angles)])
-    else:
-        res.append([-(angle_a - angle_b) for angle_a, angle_b in zip(first_conf_angles, second_conf_angles)])
-    return res
+    # every end of a bond is paired with the next residue along its chain, or the previous one at the chain's end
+    length = np.diff(offsets)[chain]
+    neighbour = np.clip(np.where(index == length - 1, index - 1, index + 1), 0, length - 1)
+    ends, neighbours = offsets[chain] + index, offsets[chain] + neighbour
 
+    x0, x1 = atoms0[ends], atoms1[ends]
+    chain_angles = calc_rotations(x0, atoms0[neighbours]) - calc_rotations(x1, atoms1[neighbours])
 
-def get_joint_angles(chains0, chains1, bonds):
-    res = []
-    for i in range(len(bonds)):
-        curr_bond_lst = [get_chain_angle_constraints((chains0[0], chains1[0]), bonds[i])]
+    mid_point = (x0[:, 0] + x0[:, 1]) / 2
+    middle_angles = calc_rotations(mid_point, x0[:, 1]) - calc_rotations(mid_point, x1[:, 1])
 
-        conf_a_chain_a, conf_a_chain_b = get_coordinates(chains0, bonds)[i]
-        conf_b_chain_a, conf_b_chain_b = get_coordinates(chains1, bonds)[i]
-        mid_point = Vector((conf_a_chain_a + conf_a_chain_b)._ar / (np.array(2)))
+    angles = np.stack((chain_angles[:, 0], middle_angles, -chain_angles[:, 1]), axis=1)
+    constraints = np.abs(2 * pin_length * np.sin(angles)) + pin_radius
 
-        first_conf_angles = calc_rotation(mid_point[0], mid_point[1], mid_point[2],
-                                          conf_a_chain_b[0], conf_a_chain_b[1], conf_a_chain_b[2])
-        second_conf_angles = calc_rotation(mid_point[0], mid_point[1], mid_point[2],
-                                           conf_b_chain_b[0], conf_b_chain_b[1], conf_b_chain_b[2])
-        curr_bond_lst.append([[angle_a - angle_b for angle_a, angle_b in zip(first_conf_angles, second_conf_angles)]])
+    return JointGeometry(x0, x1, angles, constraints)
 
-        curr_bond_lst.append(get_chain_angle_constraints((chains0[1], chains1[1]), bonds[i], False))
-        res.append(curr_bond_lst)
-    return res
+
+def get_joint_angles(chains0, chains1, bonds):
+    """
+    :return: (B, 3, 2) array of the (phi, theta) changes of the joints of every bond, see get_joint_geometry
+    """
+    return get_joint_geometry(chains0, chains1, bonds).angles
 
 
 def get_constraint_lengths(chains0, chains1, bonds, pin_length=0.05, pin_radius=0.02):
-    def calc(x):
-        return abs(2 * pin_length * math.sin(x)) + pin_radius
+    """
+    :return: the (x, y) constraint lengths of the 3 joints of every bond, as lists of tuples
+    """
+    constraints = get_joint_geometry(chains0, chains1, bonds, pin_length, pin_radius).constraints
+    return [[tuple(joint) for joint in bond] for bond in constraints.tolist()]
 
-    res = []
-    joints_angles = get_joint_angles(chains0, chains1, bonds)
-    for bond in joints_angles:
-        bond_joints = []
-        for joint in bond:
-            bond_joints.append((calc(joint[0][0]), calc(joint[0][1])))
-        res.append(bond_joints)
 
-    return res
+def compute_bonds(filename, reader='biopython', cache=False, models=(0, -1), pair_store=None,
+                  pin_length=0.05, pin_radius=0.02, **scoring_options):
+    """
+    finds the bonds of a protein and the geometry of their joints.
+    :return: dict of bonds, their ranked alternatives, their ends' coordinates in both conformations,
+             their joints' constraint lengths and the timings of the stages, as plain lists.
+    """
+    timings = {}
+    start = time.time()
+    stacks = parse_conformations(filename, reader, cache, models)
+    chains0 = [stack[0] for stack in stacks]
+    chains1 = [stack[-1] for stack in stacks]
+    timings['parse'] = time.time() - start
+
+    start = time.time()
+    store = PairStore(pair_store) if pair_store else None
+    stats = {}
+    try:
+        bonds, alternatives = find_virtualbonds(chains0, chains1, stacks, return_candidates=True, store=store,
+                                                stats=stats, **scoring_options)
+    finally:
+        if store:
+            store.close()
+    timings['bonds'] = time.time() - start
+
+    start = time.time()
+    geometry = get_joint_geometry(chains0, chains1, bonds, pin_length, pin_radius)
+    timings['geometry'] = time.time() - start
+
+    return {
+        'bonds': [[int(index) for index in bond] for bond in bonds],
+        'alternatives': [[[[int(index) for index in bond], cost] for bond, cost in bond_alternatives]
+                         for bond_alternatives in alternatives],
+        'coordinates0': geometry.coordinates0.tolist(),
+        'coordinates1': geometry.coordinates1.tolist(),
+        'constraints': geometry.constraints.tolist(),
+        'pairs': stats['pairs'],
+        'scored_pairs': stats['scored_pairs'],
+        'timings': timings,
+    }
+
+
+def save_payload(filename, coordinates, constraints):
+    """
+    saves the bonds for the blender script, which reads them with bond_builder.load_payload.
+    :param coordinates: (n, 2, 3) coordinates of the ends of the bonds
+    :param constraints: (n, 3, 2) constraint lengths of the joints of every bond
+    """
+    np.savez(filename, bonds=np.asarray(coordinates, dtype=np.float32).reshape(-1, 2, 3),
+             constraints=np.asarray(constraints, dtype=np.float32).reshape(-1, 3, 2))
 
 
-def main(protein):
+def main(protein, reader='biopython', cache=False, models=(0, -1), pair_store=None, result_store=None,
+         pin_length=0.05, pin_radius=0.02, source=SOURCE, **scoring_options):
     protein = protein.upper()
-    filename = '{}/{}.pdb'.format(DATA_DIR, protein)
-
-    if not os.path.isfile(filename):
-        pdblist = PDBList()
-        pdblist.download_pdb_files([protein], file_format='pdb', pdir=DATA_DIR)
-        fetched_filename = 'pdb{}.ent'.format(protein.lower())
-        os.rename('{}/{}'.format(DATA_DIR, fetched_filename), filename)
+    filename = install_pdb(protein, DATA_DIR, source)
 
     print('{}:'.format(protein))
-    _chains0, _chains1 = parse_chains(filename)
-    _bonds = find_virtualbonds(_chains0, _chains1)
-    print('  bonds indices: {}'.format(_bonds))
-    print('  A coordinates: {}'.format(format_coordinates(get_coordinates(_chains0, _bonds))))
-    print('  B coordinates: {}\n'.format(format_coordinates(get_coordinates(_chains1, _bonds))))
 
-    bonds_str = 'bonds = {}'.format(format_coordinates(get_coordinates(_chains0, _bonds)))
-    all_constraints_str = 'all_constraints = {}'.format(get_constraint_lengths(_chains0, _chains1, _bonds))
+    # the parameters that change the results, which key the result store
+    params = {
+        'models': None if models is None else list(models),
+        'aggregate': scoring_options.get('aggregate', 'max'),
+        'top_k': scoring_options.get('top_k', 1),
+        'separation': scoring_options.get('separation', 0),
+        'mst_backend': scoring_options.get('mst_backend', 'dense'),
+        'neighbours': scoring_options.get('neighbours', NEIGHBOURS)
+        if scoring_options.get('mst_backend') == 'sparse' else None,
+        # the bonds do not depend on it, but the numbers of scored pairs in the result do
+        'prefilter': bool(scoring_options.get('prefilter', False)),
+        'pin_length': pin_length,
+        'pin_radius': pin_radius,
+    }
+
+    store = ResultStore(result_store) if result_store else None
+    try:
+        content_hash = file_hash(filename) if store else None
+        result = store.get(protein, content_hash, params) if store else None
+        if result is None:
+            result = compute_bonds(filename, reader, cache, models, pair_store, pin_length, pin_radius,
+                                   **scoring_options)
+            if store:
+                store.put(protein, content_hash, params, result)
+        else:
+            print('  (found in the result store)')
+    finally:
+        if store:
+            store.close()
+
+    if params['prefilter']:
+        print('  pruned {} of {} pairs of chains'.format(result['pairs'] - result['scored_pairs'], result['pairs']))
+    print('  bonds indices: {}'.format([tuple(bond) for bond in result['bonds']]))
+    if params['top_k'] > 1:
+        print('  alternative bonds: {}'.format([[tuple(bond) for bond, _ in bonds] for bonds in result['alternatives']]))
+    print('  A coordinates: {}'.format(format_coordinates(result['coordinates0'])))
+    print('  B coordinates: {}\n'.format(format_coordinates(result['coordinates1'])))
+
+    bonds_str = 'bonds = {}'.format(format_coordinates(result['coordinates0']))
+    all_constraints_str = 'all_constraints = {}'.format([[tuple(joint) for joint in bond]
+                                                         for bond in result['constraints']])
 
     print('  {}'.format(bonds_str))
     print('  {}'.format(all_constraints_str))
 
-    with open(SCRIPT_SKELETON_FILENAME, 'r') as f:
-        script_skeleton = f.read()
-        script = script_skeleton.format(protein, bonds_str, all_constraints_str)
+    script_name = '{}/{}.py'.format(SCRIPTS_DIR, protein)
+    save_payload(os.path.splitext(script_name)[0] + '.npz', result['coordinates0'], result['constraints'])
 
-        script_name = '{}/{}.py'.format(SCRIPTS_DIR, protein)
-        with open(script_name, 'w') as scriptfile:
-            scriptfile.write(script)
+    with open(SCRIPT_SKELETON_FILENAME, 'r') as f:
+        script = f.read().format(protein)
+    with open(script_name, 'w') as scriptfile:
+        scriptfile.write(script)
 
-    print('\nA blender script for protein {} saved as {}.py in {} directory.'.format(protein, protein, SCRIPTS_DIR))
+    print('\nA blender script for protein {} saved as {}.py in {} directory, with its bonds in {}.npz.'.format(
+        protein, protein, SCRIPTS_DIR, protein))
+    return script_name
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('protein', help='what protein to process', type=str)
+    parser.add_argument('--max-block-mb', help='memory budget of each block of the pair scoring, in megabytes',
+                        type=float, default=MAX_BLOCK_MB)
+    parser.add_argument('--search', help='how to search for the best bond of each pair of chains',
+                        choices=SEARCHES, default='brute')
+    parser.add_argument('--jobs', help='number of processes scoring pairs of chains in parallel',
+                        type=int, default=1)
+    parser.add_argument('--reader', help='how to read the pdb file', choices=READERS, default='biopython')
+    parser.add_argument('--cache', help='cache the parsed pdb file next to it', action='store_true')
+    parser.add_argument('--models', help="comma separated indices of the models to score the bonds against, or 'all'",
+                        type=parse_models, default='0,-1')
+    parser.add_argument('--aggregate', help="how to aggregate the deviations over the models: max, mean or p<percentile>",
+                        type=check_aggregate, default='max')
+    parser.add_argument('--top-k', help='number of ranked candidate bonds to keep for every pair of chains',
+                        type=int, default=1)
+    parser.add_argument('--separation', help='minimal number of residues between candidate bonds of a pair of chains',
+                        type=int, default=0)
+    parser.add_argument('--pair-store', help='database of scored pairs of chains, so only changed chains are rescored',
+                        type=str, default=None)
+    parser.add_argument('--result-store', help='database of results, so repeated runs are not computed again',
+                        type=str, default=None)
+    parser.add_argument('--mst', help='score every pair of chains (dense) or only the pairs of near chains (sparse)',
+                        choices=MST_BACKENDS, default='dense')
+    parser.add_argument('--neighbours', help='number of nearest chains paired with every chain by the sparse mst',
+                        type=int, default=NEIGHBOURS)
+    parser.add_argument('--prefilter', help='skip the pairs of chains that are too far apart to be bonded',
+                        action='store_true')
+    parser.add_argument('--source', type=str,
+                        help='where missing pdb files are fetched from: a base url, or a local mirror directory',
+                        default=SOURCE)
+    parser.add_argument('--pin-length', help='length of the joints\' safety pins', type=float, default=0.05)
+    parser.add_argument('--pin-radius', help='radius of the joints\' safety pins', type=float, default=0.02)
 
     args = parser.parse_args()
 
-    main(args.protein)
+    main(args.protein, reader=args.reader, cache=args.cache, models=args.models, pair_store=args.pair_store,
+         result_store=args.result_store, pin_length=args.pin_length, pin_radius=args.pin_radius, jobs=args.jobs,
+         search=args.search, max_block_mb=args.max_block_mb, aggregate=args.aggregate,
+         top_k=args.top_k, separation=args.separation, mst_backend=args.mst, neighbours=args.neighbours,
+         prefilter=args.prefilter, source=args.source)
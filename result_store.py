@@ -0,0 +1,94 @@
+import argparse
+import csv
+import json
+import sqlite3
+import time
+
+
+# bump when the stored results change meaning, to invalidate old stores
+STORE_VERSION = 2
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+
+
+def params_key(params):
+    return json.dumps([STORE_VERSION, params], sort_keys=True)
+
+
+class ResultStore:
+    """
+    a persistent store of the results of process.py runs, keyed by the protein, the hash of its pdb file
+    and the parameters that change the results. a repeated run finds its result here instead of computing it.
+    """
+
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename, timeout=60)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS runs ('
+                                'protein TEXT, file_hash TEXT, params TEXT, result TEXT, created REAL, '
+                                'PRIMARY KEY (protein, file_hash, params))')
+
+    def get(self, protein, file_hash, params):
+        """
+        :return: the stored result dict, or None
+        """
+        row = self.connection.execute('SELECT result FROM runs WHERE protein = ? AND file_hash = ? AND params = ?',
+                                      (protein, file_hash, params_key(params))).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, protein, file_hash, params, result):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)',
+                                    (protein, file_hash, params_key(params), json.dumps(result), time.time()))
+
+    def runs(self):
+        """
+        iterates over all the stored runs, without loading them all at once.
+        :return: iterator of (protein, file_hash, params, result)
+        """
+        for protein, file_hash, params, result in self.connection.execute(
+                'SELECT protein, file_hash, params, result FROM runs ORDER BY protein, created'):
+            yield protein, file_hash, json.loads(params)[1], json.loads(result)
+
+    def close(self):
+        self.connection.close()
+
+
+def export(store_filename, output_filename, output_format='jsonl'):
+    """
+    exports all the runs of a store, as a json object per run ('jsonl') or as a csv row per bond ('csv').
+    :return: number of exported runs
+    """
+    store = ResultStore(store_filename)
+    count = 0
+    with open(output_filename, 'w', newline='') as f:
+        if output_format == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(['protein', 'file_hash', 'params', 'bond', 'chain_a', 'index_a', 'chain_b', 'index_b',
+                             'x0_a', 'y0_a', 'z0_a', 'x0_b', 'y0_b', 'z0_b',
+                             'lower_x', 'lower_y', 'middle_x', 'middle_y', 'upper_x', 'upper_y'])
+
+        for protein, file_hash, params, result in store.runs():
+            if output_format == 'csv':
+                for k, (bond, (u, v), constraints) in enumerate(zip(result['bonds'], result['coordinates0'],
+                                                                     result['constraints'])):
+                    writer.writerow([protein, file_hash, json.dumps(params, sort_keys=True), k] + bond + u + v +
+                                    [length for joint in constraints for length in joint])
+            else:
+                f.write(json.dumps(dict(result, protein=protein, file_hash=file_hash, params=params)) + '\n')
+            count += 1
+
+    store.close()
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='export the runs of a result store')
+    parser.add_argument('store', help='result store file', type=str)
+    parser.add_argument('output', help='where to export the runs', type=str)
+    parser.add_argument('--format', help='one json object per run, or one csv row per bond',
+                        choices=EXPORT_FORMATS, default='jsonl')
+
+    args = parser.parse_args()
+
+    _count = export(args.store, args.output, args.format)
+    print('{} runs exported to {}.'.format(_count, args.output))
@@ -0,0 +1,265 @@
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from scipy.spatial import cKDTree
+
+import numpy as np
+
+from pair_store import chain_hash
+
+
+# memory budget of a single block of the cost matrix, in megabytes
+MAX_BLOCK_MB = 256
+
+# ways of searching for the cheapest bond of a pair of chains
+SEARCHES = ('brute', 'kdtree')
+
+# ways of aggregating the deviations of a bond's length over the conformations, or 'p<q>' for the q'th percentile
+AGGREGATES = ('max', 'mean')
+
+
+def stack_chains(chains0, chains1):
+    """
+    stacks the two conformations of every chain into one contiguous array per chain.
+    :param chains0: list of (N, 3) coordinates arrays of the first conformation
+    :param chains1: list of (N, 3) coordinates arrays of the second conformation
+    :return: list of (2, N, 3) float arrays
+    """
+    return [np.ascontiguousarray(np.stack((x0, x1)), dtype=float) for x0, x1 in zip(chains0, chains1)]
+
+
+def score_pairs(stacks, pairs, jobs=1, store=None, **search_options):
+    """
+    finds the cheapest bonds of every given pair of chains.
+    with more than one job the pairs are scored by a pool of processes, which read the chains from shared memory.
+    the results do not depend on the number of jobs.
+    :param stacks: list of (K, N, 3) coordinates of the chains
+    :param pairs: list of (a, b) indices of chains
+    :param jobs: number of processes
+    :param store: a pair_store.PairStore, so that only the pairs of chains it has not seen yet are scored
+    :param search_options: passed to best_pairs (top_k, separation, search, max_block_mb, aggregate)
+    :return: list of best_pairs results, in the order of pairs
+    """
+    if store is None:
+        return compute_pairs(stacks, pairs, jobs, **search_options)
+
+    hashes = [chain_hash(stack) for stack in stacks]
+    pair_hashes = [(hashes[a], hashes[b]) for a, b in pairs]
+    options = store.options_key(search_options)
+
+    results = store.get(pair_hashes, options)
+    missing = [k for k, bonds in enumerate(results) if bonds is None]
+    computed = compute_pairs(stacks, [pairs[k] for k in missing], jobs, **search_options)
+    store.put([pair_hashes[k] for k in missing], options, computed)
+
+    for k, bonds in zip(missing, computed):
+        results[k] = bonds
+    return results
+
+
+def compute_pairs(stacks, pairs, jobs=1, **search_options):
+    if jobs <= 1 or len(pairs) < 2:
+        return [best_pairs(stacks[a], stacks[b], **search_options) for a, b in pairs]
+
+    offsets = np.cumsum([0] + [stack.shape[1] for stack in stacks])
+    shape = (len(stacks[0]), int(offsets[-1]), 3)
+    shm = SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+    try:
+        atoms = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        for stack, start, end in zip(stacks, offsets, offsets[1:]):
+            atoms[:, start:end] = stack
+        del atoms
+
+        with Pool(jobs, initializer=_attach_chains, initargs=(shm.name, shape, offsets, search_options)) as pool:
+            return pool.map(_score_pair, pairs, chunksize=max(1, len(pairs) // (4 * jobs)))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+# the chains of a pool worker, attached by _attach_chains
+_worker = {}
+
+
+def _attach_chains(name, shape, offsets, search_options):
+    shm = SharedMemory(name=name)
+    atoms = np.ndarray(shape, dtype=float, buffer=shm.buf)
+    _worker['shm'] = shm
+    _worker['stacks'] = [atoms[:, start:end] for start, end in zip(offsets, offsets[1:])]
+    _worker['search_options'] = search_options
+
+
+def _score_pair(pair):
+    a, b = pair
+    stacks = _worker['stacks']
+    return best_pairs(stacks[a], stacks[b], **_worker['search_options'])
+
+
+def check_aggregate(aggregate):
+    if aggregate not in AGGREGATES and not (aggregate.startswith('p') and 0 <= float(aggregate[1:]) <= 100):
+        raise ValueError("aggregate must be one of {} or 'p<percentile>', not {!r}".format(AGGREGATES, aggregate))
+    return aggregate
+
+
+def bond_costs(xa, xb, aggregate='max'):
+    """
+    the cost of bonding the atoms xa to the atoms xb, elementwise (the arrays are broadcast):
+    agg_k |dk - d0| + d0, where dk is the distance between the atoms in conformation k.
+    with two conformations every aggregate gives |d1 - d0| + d0.
+    :param xa: (K, ..., 3) coordinates in chain a
+    :param xb: (K, ..., 3) coordinates in chain b
+    :param aggregate: 'max', 'mean' or 'p<q>' for the q'th percentile of the deviations
+    :return: (...) costs
+    """
+    squared = 0
+    for axis in range(3):
+        diff = xa[..., axis] - xb[..., axis]
+        squared = squared + diff * diff
+
+    distances = np.sqrt(squared)
+    d0 = distances[0]
+    if len(distances) == 2:
+        return np.abs(d0 - distances[1]) + d0
+
+    deviations = np.abs(d0 - distances[1:])
+    if aggregate == 'max':
+        deviation = deviations.max(axis=0)
+    elif aggregate == 'mean':
+        deviation = deviations.mean(axis=0)
+    else:
+        deviation = np.percentile(deviations, float(aggregate[1:]), axis=0)
+
+    return deviation + d0
+
+
+def pair_costs(xa, xb, aggregate='max'):
+    """
+    the cost of bonding every atom of chain a to every atom of chain b.
+    :param xa: (K, M, 3) coordinates of chain a
+    :param xb: (K, N, 3) coordinates of chain b
+    :param aggregate: see bond_costs
+    :return: (M, N) costs
+    """
+    return bond_costs(xa[:, :, None], xb[:, None], aggregate)
+
+
+def block_shape(m, n, conformations=2, max_block_mb=MAX_BLOCK_MB):
+    """
+    the largest (rows, cols) block of the M x N cost matrix whose temporaries fit in the memory budget.
+    pair_costs keeps about 3 arrays per conformation and 2 more alive for every cell of the block.
+    """
+    cell_bytes = 8 * (3 * conformations + 2)
+    cells = max(1, int(max_block_mb * 2 ** 20) // cell_bytes)
+
+    if cells >= n:
+        return max(1, min(m, cells // max(n, 1))), n
+    return 1, cells
+
+
+def best_pairs(xa, xb, top_k=1, separation=0, search='brute', max_block_mb=MAX_BLOCK_MB, aggregate='max'):
+    """
+    finds the cheapest bonds between chain a and chain b, in a single pass over the pairs of atoms.
+    ties are broken by the first (i, j) in row-major order.
+    :param xa: (K, M, 3) coordinates of chain a
+    :param xb: (K, N, 3) coordinates of chain b
+    :param top_k: number of bonds to find
+    :param separation: every bond is at least this many residues away from the cheaper bonds, in chain a or in chain b
+    :param search: 'brute' scores every pair of atoms, 'kdtree' only the pairs that may beat a known bond
+    :param max_block_mb: memory budget of each block of scored pairs
+    :param aggregate: how the deviations over more than two conformations are aggregated, see bond_costs
+    :return: list of up to top_k (cost, i, j), cheapest first, where i is the atom index in chain a
+             and j is the atom index in chain b
+    """
+    m, n = xa.shape[1], xb.shape[1]
+    if m == 0 or n == 0:
+        return [(float('inf'), 0, 0)]
+
+    # enough of the cheapest pairs to be left with top_k after the ones too close to a cheaper bond are dropped
+    pool_size = top_k * max(1, 2 * separation - 1) ** 2
+
+    if search == 'kdtree':
+        costs, flat = cheapest_pairs_kdtree(xa, xb, pool_size, max_block_mb, aggregate)
+    else:
+        costs, flat = cheapest_pairs_brute(xa, xb, pool_size, max_block_mb, aggregate)
+
+    bonds = []
+    for cost, (i, j) in zip(costs.tolist(), zip(*divmod(flat, n))):
+        if all(abs(i - s) >= separation or abs(j - t) >= separation for _, s, t in bonds):
+            bonds.append((cost, int(i), int(j)))
+            if len(bonds) == top_k:
+                break
+
+    return bonds
+
+
+def cheapest_indices(costs, size):
+    """
+    the indices of the size cheapest costs, unordered.
+    every cost tied with the size'th cheapest is kept as well, so that the ties can be broken later.
+    """
+    if len(costs) <= size:
+        return np.arange(len(costs))
+
+    threshold = costs.min() if size == 1 else np.partition(costs, size - 1)[size - 1]
+    return np.flatnonzero(costs <= threshold)
+
+
+def cheapest(costs, flat, size):
+    """
+    the size cheapest of some scored pairs, ordered by cost and then by their row-major index.
+    :param costs: costs of the pairs
+    :param flat: row-major indices of the pairs
+    :return: costs, flat
+    """
+    kept = cheapest_indices(costs, size)
+    costs, flat = costs[kept], flat[kept]
+
+    order = np.lexsort((flat, costs))[:size]
+    return costs[order], flat[order]
+
+
+def cheapest_pairs_brute(xa, xb, size, max_block_mb=MAX_BLOCK_MB, aggregate='max'):
+    """
+    the cost matrix is streamed in blocks that fit in max_block_mb, keeping only the running cheapest pairs.
+    """
+    m, n = xa.shape[1], xb.shape[1]
+    rows, cols = block_shape(m, n, len(xa), max_block_mb)
+
+    best_costs, best_flat = np.zeros(0), np.zeros(0, dtype=np.int64)
+    for i0 in range(0, m, rows):
+        for j0 in range(0, n, cols):
+            costs = pair_costs(xa[:, i0:i0 + rows], xb[:, j0:j0 + cols], aggregate)
+            kept = cheapest_indices(costs.ravel(), size)
+            i, j = divmod(kept, costs.shape[1])
+            best_costs, best_flat = cheapest(np.concatenate((best_costs, costs.ravel()[kept])),
+                                             np.concatenate((best_flat, (i0 + i) * n + (j0 + j))), size)
+
+    return best_costs, best_flat
+
+
+def cheapest_pairs_kdtree(xa, xb, size, max_block_mb=MAX_BLOCK_MB, aggregate='max'):
+    """
+    branch-and-bound search over a kd-tree of the first conformation.
+    the cost of a bond is at least its length d0 in the first conformation, so after the nearest neighbours
+    give an upper bound on the size'th cheapest cost, only the pairs closer than that bound need to be scored.
+    """
+    m, n = xa.shape[1], xb.shape[1]
+    if m * n <= size:
+        return cheapest_pairs_brute(xa, xb, size, max_block_mb, aggregate)
+
+    tree_b = cKDTree(xb[0])
+    neighbours = min(n, -(-size // m))
+    _, nearest = tree_b.query(xa[0], k=neighbours)
+    nearest = nearest.reshape(m, neighbours)
+    seeds = bond_costs(xa[:, :, None], xb[:, nearest], aggregate).ravel()
+    upper_bound = np.partition(seeds, size - 1)[size - 1]
+
+    # the slack covers rounding differences between the kd-tree distances and bond_costs
+    radius = upper_bound * (1 + 1e-9) + 1e-9
+    candidates = cKDTree(xa[0]).sparse_distance_matrix(tree_b, radius, output_type='ndarray')
+    rows, cols = candidates['i'], candidates['j']
+
+    chunk = int(np.prod(block_shape(1, len(rows), len(xa), max_block_mb)))
+    costs = np.concatenate([bond_costs(xa[:, rows[k:k + chunk]], xb[:, cols[k:k + chunk]], aggregate)
+                            for k in range(0, len(rows), chunk)])
+
+    return cheapest(costs, rows.astype(np.int64) * n + cols, size)
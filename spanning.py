@@ -0,0 +1,149 @@
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components, minimum_spanning_tree
+from scipy.spatial import cKDTree
+
+import numpy as np
+import heapq
+
+
+# ways of building the spanning tree of the chains:
+# 'dense' scores every pair of chains, 'sparse' only the pairs of chains that are near neighbours
+MST_BACKENDS = ('dense', 'sparse')
+
+# number of nearest chains every chain is paired with by the sparse backend
+NEIGHBOURS = 8
+
+
+def chain_centroids(stacks, conformation=0):
+    """
+    :param stacks: list of (K, N, 3) coordinates of the chains
+    :return: (n, 3) centroids of the chains in the given conformation
+    """
+    return np.array([stack[conformation].mean(axis=0) if stack.shape[1] else np.zeros(3) for stack in stacks])
+
+
+def neighbour_pairs(centroids, neighbours=NEIGHBOURS):
+    """
+    pairs every chain with its nearest chains, by their centroids.
+    the number of neighbours is doubled until the pairs connect all the chains.
+    :param centroids: (n, 3) centroids of the chains
+    :param neighbours: initial number of neighbours of every chain
+    :return: sorted list of (a, b) pairs of chains, a > b
+    """
+    n = len(centroids)
+    tree = cKDTree(centroids)
+    neighbours = max(1, neighbours)
+
+    while True:
+        k = min(n, neighbours + 1)  # every chain is its own nearest neighbour
+        _, nearest = tree.query(centroids, k=k)
+        nearest = nearest.reshape(n, k)
+        pairs = sorted({(max(a, b), min(a, b)) for a in range(n) for b in nearest[a].tolist() if a != b})
+
+        if k == n or is_connected(n, pairs):
+            return pairs
+        neighbours *= 2
+
+
+def is_connected(n, pairs):
+    return connected_components(pairs_matrix(n, pairs, np.ones(len(pairs))), directed=False)[0] == 1
+
+
+def pairs_matrix(n, pairs, weights):
+    """
+    a sparse (n, n) matrix with the weights of the pairs, upper triangular.
+    """
+    pairs = np.array(pairs, dtype=int).reshape(-1, 2)
+    return coo_matrix((weights, (pairs.min(axis=1), pairs.max(axis=1))), shape=(n, n)).tocsr()
+
+
+def sparse_mst(n, pairs, costs):
+    """
+    the minimum spanning tree of a sparse graph of chains.
+    :param n: number of chains
+    :param pairs: list of (a, b) pairs of chains
+    :param costs: cost of every pair
+    :return: sorted list of the (a, b) edges of the tree, a < b
+    """
+    tree = minimum_spanning_tree(pairs_matrix(n, pairs, costs)).tocoo()
+    return sorted(zip(tree.row.tolist(), tree.col.tolist()))
+
+
+def chain_spheres(stacks):
+    """
+    :param stacks: list of (K, N, 3) coordinates of the chains
+    :return: (n, K, 3) centres and (n, K) radii of the bounding spheres of the chains in every conformation
+    """
+    centres = np.array([stack.mean(axis=1) if stack.shape[1] else np.zeros((len(stack), 3)) for stack in stacks])
+    radii = np.array([np.linalg.norm(stack - centre[:, None], axis=2).max(axis=1) if stack.shape[1]
+                      else np.zeros(len(stack)) for stack, centre in zip(stacks, centres)])
+    return centres, radii
+
+
+def lower_bounds(spheres, pairs, aggregate='max'):
+    """
+    lower bounds on the cost of the cheapest bond of every pair of chains, from their bounding spheres.
+    a bond is at least as long as the gap between the spheres in every conformation, and its cost
+    (see scoring.bond_costs) is at least its length d0 in the first conformation. with two conformations or the
+    'max' aggregate it is at least its length in every conformation, since |dk - d0| + d0 >= dk.
+    :param spheres: chain_spheres of the chains
+    :param pairs: list of (a, b) pairs of chains
+    :return: (len(pairs),) lower bounds
+    """
+    centres, radii = spheres
+    a, b = np.array(pairs, dtype=int).reshape(-1, 2).T
+    gaps = np.linalg.norm(centres[a] - centres[b], axis=2) - radii[a] - radii[b]
+    gaps = np.maximum(gaps, 0)
+
+    if gaps.shape[1] == 2 or aggregate == 'max':
+        return gaps.max(axis=1)
+    return gaps[:, 0]
+
+
+def lazy_kruskal(n, pairs, bounds, score, batch_size=1):
+    """
+    Kruskal's algorithm over pairs of chains whose costs are known only through lower bounds until they are scored.
+    the pairs are taken cheapest first by their bounds, and a pair is scored only if it is reached while it still
+    joins two components of the tree. a scored pair joins the tree once its cost is the cheapest of all the
+    remaining costs and bounds, so the tree is a minimum spanning tree of all the pairs.
+    :param n: number of chains
+    :param pairs: list of (a, b) pairs of chains
+    :param bounds: lower bound of the cost of every pair
+    :param score: function of a list of pairs, returning their costs
+    :param batch_size: number of pairs scored together, e.g. by a pool of processes
+    :return: sorted list of the (a, b) edges of the tree (a < b), and the indices of the scored pairs
+    """
+    # (cost or bound, whether scored, index of the pair), so a bound is scored before a tied cost is taken
+    heap = [(bound, False, k) for k, bound in enumerate(np.asarray(bounds).tolist())]
+    heapq.heapify(heap)
+    parents = list(range(n))
+
+    def find(node):
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    edges, scored = [], []
+    while heap and len(edges) < n - 1:
+        value, is_scored, k = heapq.heappop(heap)
+        a, b = find(pairs[k][0]), find(pairs[k][1])
+        if a == b:
+            continue
+
+        if is_scored:
+            parents[a] = b
+            edges.append(tuple(sorted(pairs[k])))
+            continue
+
+        batch = [k]
+        while heap and len(batch) < batch_size and not heap[0][1]:
+            _, _, k = heapq.heappop(heap)
+            if find(pairs[k][0]) != find(pairs[k][1]):
+                batch.append(k)
+
+        for k, cost in zip(batch, score([pairs[k] for k in batch])):
+            heapq.heappush(heap, (cost, True, k))
+        scored.extend(batch)
+
+    return sorted(edges), sorted(scored)
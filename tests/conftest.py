@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules of the project are in its root directory, which the tests also run from
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
@@ -0,0 +1,92 @@
+import glob
+import math
+
+import numpy as np
+import pytest
+from scipy.sparse.csgraph import minimum_spanning_tree
+
+from process import build_mst, find_virtualbonds, parse_chains
+
+
+PDB_FILENAMES = sorted(glob.glob('data/*.pdb'))
+
+
+def reference_build_mst(chains0, chains1):
+    """
+    the original build_mst: every ordered pair of chains, and every pair of their atoms, one at a time.
+    """
+    def norm(u, v):
+        return math.sqrt((u[0] - v[0]) * (u[0] - v[0]) + (u[1] - v[1]) * (u[1] - v[1]) +
+                         (u[2] - v[2]) * (u[2] - v[2]))
+
+    chains0 = [np.asarray(chain, dtype=float).tolist() for chain in chains0]
+    chains1 = [np.asarray(chain, dtype=float).tolist() for chain in chains1]
+
+    n = len(chains0)
+    graph = np.zeros((n, n))
+    nodes = -np.ones((n, n))
+
+    for a, (x0a, x1a) in enumerate(zip(chains0, chains1)):
+        for b, (x0b, x1b) in enumerate(zip(chains0, chains1)):
+            s = t = 0
+            min_distance = float('inf')
+            for i, (x0ia, x1ia) in enumerate(zip(x0a, x1a)):
+                for j, (x0jb, x1jb), in enumerate(zip(x0b, x1b)):
+                    distance = abs(norm(x0ia, x0jb) - norm(x1ia, x1jb)) + norm(x0ia, x0jb)
+                    if distance < min_distance:
+                        min_distance = distance
+                        s, t = i, j
+
+            graph[a][b] = graph[b][a] = min_distance
+            nodes[a][b] = t
+            nodes[b][a] = s
+
+    mst = minimum_spanning_tree(graph)
+    return graph, mst.toarray().astype(float), nodes.astype(int)
+
+
+def reference_bonds(mst, nodes):
+    n = len(mst)
+    return [(a, nodes[b][a], b, nodes[a][b]) for a in range(n) for b in range(n) if mst[a][b] > 0]
+
+
+@pytest.fixture(scope='module', params=PDB_FILENAMES)
+def reference(request):
+    chains0, chains1 = parse_chains(request.param)
+    graph, mst, nodes = reference_build_mst(chains0, chains1)
+    return request.param, chains0, chains1, graph, mst, nodes
+
+
+@pytest.mark.parametrize('search', ['brute', 'kdtree'])
+def test_build_mst_matches_the_loop(reference, search):
+    _, chains0, chains1, graph, mst, nodes = reference
+    new_mst, new_nodes, candidates = build_mst(chains0, chains1, return_candidates=True, search=search)
+
+    # the diagonal of nodes is not a bond, and is left at -1
+    off_diagonal = ~np.eye(len(chains0), dtype=bool)
+    np.testing.assert_array_equal(new_mst, mst)
+    np.testing.assert_array_equal(new_nodes[off_diagonal], nodes[off_diagonal])
+    for (a, b), bonds in candidates.items():
+        assert bonds[0][0] == graph[a][b]
+
+
+@pytest.mark.parametrize('options', [
+    dict(search='brute'),
+    dict(search='kdtree'),
+    dict(mst_backend='sparse'),
+    dict(prefilter=True),
+    dict(mst_backend='sparse', prefilter=True, search='kdtree'),
+])
+def test_bonds_match_the_loop(reference, options):
+    _, chains0, chains1, _, mst, nodes = reference
+    bonds = find_virtualbonds(chains0, chains1, **options)
+
+    assert sorted(map(tuple, np.asarray(bonds).tolist())) == \
+        sorted(map(tuple, np.asarray(reference_bonds(mst, nodes)).tolist()))
+
+
+def test_fast_reader_matches_the_loop(reference):
+    filename, _, _, _, mst, nodes = reference
+    chains0, chains1 = parse_chains(filename, reader='fast')
+
+    assert find_virtualbonds(chains0, chains1) == reference_bonds(mst, nodes)
@@ -0,0 +1,21 @@
+import hashlib
+import shutil
+
+from fetcher import fetch_pdb, install_pdb
+
+
+def test_editing_an_installed_file_keeps_the_cached_object(tmp_path):
+    mirror, data_dir, cache_dir = tmp_path / 'mirror', tmp_path / 'data', tmp_path / 'cache'
+    mirror.mkdir()
+    data_dir.mkdir()
+    shutil.copy('data/2JUV.pdb', str(mirror / '2JUV.pdb'))
+
+    filename = install_pdb('2juv', str(data_dir), str(mirror), str(cache_dir))
+    with open(filename, 'a') as f:
+        f.write('REMARK edited\n')
+
+    path = fetch_pdb('2JUV', str(mirror), str(cache_dir))
+    with open(path, 'rb') as f, open('data/2JUV.pdb', 'rb') as original:
+        content = f.read()
+        assert content == original.read()
+    assert path.endswith('{}.pdb'.format(hashlib.sha1(content).hexdigest()))
@@ -0,0 +1,70 @@
+import glob
+import math
+
+import numpy as np
+import pytest
+
+from pdb_reader import read_pdb
+from process import find_virtualbonds, get_joint_geometry
+
+
+PIN_LENGTH, PIN_RADIUS = 0.05, 0.02
+
+
+def rotation(a, b):
+    vx, vy, vz = (float(v) for v in np.subtract(b, a))
+    distance = math.sqrt(vx * vx + vy * vy + vz * vz)
+    return math.atan2(vy, vx), math.acos(max(-1.0, min(1.0, vz / distance))) if distance > 0 else 0.0
+
+
+def angle_change(a0, b0, a1, b1):
+    return [first - second for first, second in zip(rotation(a0, b0), rotation(a1, b1))]
+
+
+def reference_joint(chain0, chain1, index):
+    # the end of a bond and the next residue along its chain, or the previous one at the chain's end
+    neighbour = index - 1 if index == len(chain0) - 1 else index + 1
+    return angle_change(chain0[index], chain0[neighbour], chain1[index], chain1[neighbour])
+
+
+def reference_joint_geometry(chains0, chains1, bonds):
+    """
+    the angles and constraint lengths of one bond at a time, each from the bond's own chains.
+    """
+    all_angles, all_constraints = [], []
+    for a, i, b, j in bonds:
+        mid_point = (chains0[a][i] + chains0[b][j]) / 2
+        angles = [reference_joint(chains0[a], chains1[a], i),
+                  angle_change(mid_point, chains0[b][j], mid_point, chains1[b][j]),
+                  [-angle for angle in reference_joint(chains0[b], chains1[b], j)]]
+        all_angles.append(angles)
+        all_constraints.append([[abs(2 * PIN_LENGTH * math.sin(angle)) + PIN_RADIUS for angle in joint]
+                                for joint in angles])
+
+    return np.array(all_angles), np.array(all_constraints)
+
+
+def assert_matches_reference(chains0, chains1, bonds):
+    geometry = get_joint_geometry(chains0, chains1, bonds, PIN_LENGTH, PIN_RADIUS)
+    angles, constraints = reference_joint_geometry(chains0, chains1, bonds)
+
+    np.testing.assert_allclose(geometry.angles, angles, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(geometry.constraints, constraints, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(geometry.coordinates0, [(chains0[a][i], chains0[b][j]) for a, i, b, j in bonds])
+    np.testing.assert_array_equal(geometry.coordinates1, [(chains1[a][i], chains1[b][j]) for a, i, b, j in bonds])
+
+
+@pytest.mark.parametrize('filename', sorted(glob.glob('data/*.pdb')))
+def test_joint_geometry_matches_the_reference(filename):
+    stacks = read_pdb(filename).stacks
+    chains0, chains1 = [stack[0] for stack in stacks], [stack[-1] for stack in stacks]
+
+    bonds = find_virtualbonds(chains0, chains1, stacks, search='kdtree')
+    assert_matches_reference(chains0, chains1, bonds)
+
+    # the ends of the chains take the previous residue, and bonds between any chains use their own chains
+    last = [len(chain) - 1 for chain in chains0]
+    n = len(chains0)
+    extra = [(a, last[a], b, last[b]) for a in range(n) for b in range(n) if a != b][:20]
+    extra += [(n - 1, 0, n - 2, last[n - 2]), (n - 2, last[n - 2], n - 1, 1)]
+    assert_matches_reference(chains0, chains1, extra)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from joint_library import JOINT_STEP
+from joint_mesh import bond_meshes, joint_meshes
+
+
+def test_snaps_follow_their_joints():
+    meshes = dict((name, vertices) for name, vertices, _ in bond_meshes(20.0, [(.05, .05)] * 3))
+
+    for joint, z in (('lower', 0), ('middle', 10), ('upper', 20)):
+        assert abs(meshes['{}_snap'.format(joint)][:, 2].mean() - z) < 1e-6
+
+
+def test_library_joints_match_built_joints(tmp_path):
+    # constraints on the library's grid, so that rounding them changes nothing
+    constraints = [(10 * JOINT_STEP, 8 * JOINT_STEP), (12 * JOINT_STEP, 6 * JOINT_STEP), (4 * JOINT_STEP,) * 2]
+    built = bond_meshes(6.0, constraints)
+
+    for library in (built, bond_meshes(6.0, constraints, library=str(tmp_path)),
+                    bond_meshes(6.0, constraints, library=str(tmp_path))):
+        assert [name for name, _, _ in library] == [name for name, _, _ in built]
+        for (_, vertices, triangles), (_, built_vertices, built_triangles) in zip(library, built):
+            np.testing.assert_array_equal(triangles, built_triangles)
+            np.testing.assert_allclose(vertices, built_vertices, atol=1e-5)
+
+
+def test_joint_meshes_are_closed():
+    for name, vertices, triangles in joint_meshes(0, .06, .04):
+        edges = np.concatenate((triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]))
+        directed = set(map(tuple, edges.tolist()))
+        assert len(directed) == len(edges), name
+        assert all((b, a) in directed for a, b in directed), name
+
+
+def test_wide_constraint_boxes_are_narrowed():
+    with pytest.warns(UserWarning, match='narrowed'):
+        meshes = joint_meshes(0, .32, .3)
+
+    for name, vertices, triangles in meshes:
+        corners = vertices[triangles]
+        volume = np.einsum('ij,ij->i', corners[:, 0], np.cross(corners[:, 1], corners[:, 2])).sum() / 6
+        assert volume > 0, name
+
+
+@pytest.mark.parametrize('constraints', [(.02, .02), (.1, .1), (.03, .07), (.05, .05)])
+@pytest.mark.parametrize('size', [.5, 1.0])
+def test_joint_meshes_have_no_slivers(constraints, size):
+    for name, vertices, triangles in joint_meshes(0, *constraints, size):
+        corners = vertices[triangles]
+        areas = np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=-1) / 2
+        assert areas.min() > 1e-12, name
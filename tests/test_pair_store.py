@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from pair_store import PairStore, chain_hash
+from scoring import score_pairs
+
+
+def random_stacks(n, seed):
+    rng = np.random.default_rng(seed)
+    return list(rng.uniform(0, 20, (n, 2, 8, 3)))
+
+
+def plain(results):
+    return [[(float(cost), int(i), int(j)) for cost, i, j in bonds] for bonds in results]
+
+
+@pytest.mark.parametrize('options', [{}, {'top_k': 3, 'separation': 2}, {'aggregate': 'mean'}])
+def test_stored_pairs_match_scored_pairs(options, tmp_path):
+    stacks = random_stacks(6, 0)
+    pairs = [(a, b) for a in range(len(stacks)) for b in range(a)]
+    expected = plain(score_pairs(stacks, pairs, **options))
+
+    store = PairStore(str(tmp_path / 'pairs.db'))
+    assert plain(score_pairs(stacks, pairs, store=store, **options)) == expected
+    assert plain(score_pairs(stacks, pairs, store=store, **options)) == expected
+    store.close()
+
+    # the store outlives the run
+    store = PairStore(str(tmp_path / 'pairs.db'))
+    hashes = [chain_hash(stack) for stack in stacks]
+    stored = store.get([(hashes[a], hashes[b]) for a, b in pairs], store.options_key(options))
+    assert plain(stored) == expected
+    store.close()
+
+
+def test_only_the_pairs_of_an_edited_chain_miss_the_store(tmp_path):
+    stacks = random_stacks(6, 1)
+    pairs = [(a, b) for a in range(len(stacks)) for b in range(a)]
+    store = PairStore(str(tmp_path / 'pairs.db'))
+    score_pairs(stacks, pairs, store=store)
+
+    stacks[2] = stacks[2] + 0.5
+    hashes = [chain_hash(stack) for stack in stacks]
+    stored = store.get([(hashes[a], hashes[b]) for a, b in pairs], store.options_key({}))
+    assert [pair for pair, bonds in zip(pairs, stored) if bonds is None] == [pair for pair in pairs if 2 in pair]
+
+    # the search method does not change the bonds, so it shares the stored pairs. top_k does not
+    assert store.options_key({'search': 'kdtree', 'max_block_mb': 1}) == store.options_key({})
+    assert store.options_key({'top_k': 2}) != store.options_key({})
+    assert plain(score_pairs(stacks, pairs, store=store)) == plain(score_pairs(stacks, pairs))
+    store.close()
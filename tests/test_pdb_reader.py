@@ -0,0 +1,97 @@
+import glob
+import gzip
+import shutil
+
+import numpy as np
+import pytest
+from Bio.PDB import MMCIFIO, PDBParser
+
+from pdb_reader import load_pdb, read_pdb, read_pdb_biopython
+
+
+PDB_FILENAMES = sorted(glob.glob('data/*.pdb'))
+
+
+def assert_same_chains(a, b):
+    assert a.n_models == b.n_models
+    assert list(a.chain_ids) == list(b.chain_ids)
+    assert [[tuple(residue_id) for residue_id in residues] for residues in a.residue_ids] == \
+           [[tuple(residue_id) for residue_id in residues] for residues in b.residue_ids]
+    assert len(a.stacks) == len(b.stacks)
+    for stack_a, stack_b in zip(a.stacks, b.stacks):
+        np.testing.assert_array_equal(stack_a, stack_b)
+
+
+def gzipped(filename, directory):
+    compressed = str(directory / '{}.gz'.format(filename.split('/')[-1]))
+    with open(filename, 'rb') as f, gzip.open(compressed, 'wb') as g:
+        shutil.copyfileobj(f, g)
+    return compressed
+
+
+def as_cif(filename, directory):
+    converted = str(directory / filename.split('/')[-1].replace('.pdb', '.cif'))
+    writer = MMCIFIO()
+    writer.set_structure(PDBParser(QUIET=True).get_structure('PROTEIN', filename))
+    writer.save(converted)
+    return converted
+
+
+def without_column(filename, column, directory):
+    # the same mmcif file, without one column of its _atom_site loop
+    stripped = str(directory / 'without_{}.cif'.format(column))
+    with open(filename) as f:
+        lines = f.read().splitlines()
+    names = [line.strip() for line in lines if line.startswith('_atom_site.')]
+    index = names.index('_atom_site.{}'.format(column))
+
+    with open(stripped, 'w') as f:
+        for line in lines:
+            if line.startswith('_atom_site.'):
+                if line.strip() != names[index]:
+                    f.write(line + '\n')
+            elif line.startswith(('ATOM', 'HETATM')):
+                tokens = line.split()
+                f.write(' '.join(tokens[:index] + tokens[index + 1:]) + '\n')
+            else:
+                f.write(line + '\n')
+    return stripped
+
+
+@pytest.mark.parametrize('filename', PDB_FILENAMES)
+@pytest.mark.parametrize('models', [(0, -1), (0,), None])
+def test_fast_reader_matches_biopython(filename, models):
+    assert_same_chains(read_pdb(filename, models), read_pdb_biopython(filename, models))
+
+
+@pytest.mark.parametrize('filename', PDB_FILENAMES[:2])
+def test_compressed_and_cif_files_read_the_same(filename, tmp_path):
+    expected = read_pdb_biopython(filename)
+    cif = as_cif(filename, tmp_path)
+    for variant in (gzipped(filename, tmp_path), cif, gzipped(cif, tmp_path)):
+        assert_same_chains(read_pdb(variant), expected)
+        assert_same_chains(read_pdb_biopython(variant), expected)
+
+
+@pytest.mark.parametrize('column', ['label_seq_id', 'auth_seq_id'])
+def test_cif_files_with_either_residue_number(column, tmp_path):
+    filename = PDB_FILENAMES[0]
+    assert_same_chains(read_pdb(without_column(as_cif(filename, tmp_path), column, tmp_path)),
+                       read_pdb_biopython(filename))
+
+
+@pytest.mark.parametrize('reader', ['biopython', 'fast'])
+def test_cached_chains_match_parsed_chains(reader, tmp_path):
+    filename = str(tmp_path / 'protein.pdb')
+    shutil.copy(PDB_FILENAMES[0], filename)
+    expected = load_pdb(filename, reader)
+
+    cold = load_pdb(filename, reader, cache=True)
+    warm = load_pdb(filename, reader, cache=True)
+    assert_same_chains(cold, expected)
+    assert_same_chains(warm, expected)
+    assert len(glob.glob('{}.cache/*'.format(filename))) == 1
+
+    # other options are cached apart
+    assert_same_chains(load_pdb(filename, reader, models=None, cache=True), load_pdb(filename, reader, models=None))
+    assert len(glob.glob('{}.cache/*'.format(filename))) == 2
@@ -0,0 +1,53 @@
+import csv
+import json
+
+import pytest
+
+from process import compute_bonds
+from result_store import ResultStore, export
+
+
+PARAMS = {'reader': 'fast', 'models': [0, -1], 'top_k': 1, 'prefilter': False}
+
+
+@pytest.fixture(scope='module')
+def result():
+    # stored as json, so it is compared after a round trip through it
+    return json.loads(json.dumps(compute_bonds('data/2JUV.pdb', reader='fast')))
+
+
+def test_results_are_found_by_protein_file_and_params(result, tmp_path):
+    store = ResultStore(str(tmp_path / 'results.db'))
+    store.put('2JUV', 'hash', PARAMS, result)
+
+    assert store.get('2JUV', 'hash', PARAMS) == result
+    assert store.get('2JUV', 'hash', dict(reversed(list(PARAMS.items())))) == result
+    assert store.get('2JUV', 'other hash', PARAMS) is None
+    assert store.get('2LME', 'hash', PARAMS) is None
+    assert store.get('2JUV', 'hash', dict(PARAMS, prefilter=True)) is None
+    store.close()
+
+    store = ResultStore(str(tmp_path / 'results.db'))
+    assert list(store.runs()) == [('2JUV', 'hash', PARAMS, result)]
+    store.close()
+
+
+def test_export(result, tmp_path):
+    store_filename = str(tmp_path / 'results.db')
+    store = ResultStore(store_filename)
+    store.put('2JUV', 'hash', PARAMS, result)
+    store.put('2JUV', 'hash', dict(PARAMS, top_k=2), result)
+    store.close()
+
+    assert export(store_filename, str(tmp_path / 'runs.jsonl'), 'jsonl') == 2
+    with open(str(tmp_path / 'runs.jsonl')) as f:
+        runs = [json.loads(line) for line in f]
+    assert [run['params'] for run in runs] == [PARAMS, dict(PARAMS, top_k=2)]
+    assert all(run['bonds'] == result['bonds'] and run['protein'] == '2JUV' for run in runs)
+
+    assert export(store_filename, str(tmp_path / 'bonds.csv'), 'csv') == 2
+    with open(str(tmp_path / 'bonds.csv'), newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 2 * len(result['bonds'])
+    assert [int(row['chain_a']) for row in rows[:len(result['bonds'])]] == [bond[0] for bond in result['bonds']]
+    assert float(rows[0]['upper_y']) == result['constraints'][0][2][1]
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from pdb_reader import read_pdb
+from process import parse_models
+from scoring import best_pairs, bond_costs, check_aggregate, score_pairs
+
+
+def random_stacks(n, seed, conformations=2):
+    rng = np.random.default_rng(seed)
+    return list(rng.uniform(0, 20, (n, conformations, 12, 3)))
+
+
+@pytest.mark.parametrize('search', ['brute', 'kdtree'])
+@pytest.mark.parametrize('options', [{}, {'top_k': 3, 'separation': 2}])
+def test_results_do_not_depend_on_the_number_of_jobs(search, options):
+    stacks = random_stacks(7, 0)
+    pairs = [(a, b) for a in range(len(stacks)) for b in range(a)]
+
+    assert score_pairs(stacks, pairs, jobs=2, search=search, **options) == \
+        score_pairs(stacks, pairs, jobs=1, search=search, **options)
+
+
+def reference_cost(xa, xb, i, j, aggregate):
+    # the cost of one pair of atoms, from its distance in every model
+    distances = [np.linalg.norm(a - b) for a, b in zip(xa[:, i], xb[:, j])]
+    deviations = [abs(d - distances[0]) for d in distances[1:]]
+    if aggregate == 'max':
+        deviation = max(deviations)
+    elif aggregate == 'mean':
+        deviation = sum(deviations) / len(deviations)
+    else:
+        deviation = np.percentile(deviations, float(aggregate[1:]))
+    return deviation + distances[0]
+
+
+@pytest.mark.parametrize('conformations', [2, 3, 5])
+@pytest.mark.parametrize('aggregate', ['max', 'mean', 'p50', 'p90', 'p100'])
+def test_bond_costs_match_the_models(conformations, aggregate):
+    xa, xb = random_stacks(2, 1, conformations)
+    costs = bond_costs(xa[:, :, None], xb[:, None], aggregate)
+
+    expected = [[reference_cost(xa, xb, i, j, aggregate) for j in range(xb.shape[1])] for i in range(xa.shape[1])]
+    np.testing.assert_allclose(costs, expected, rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('search', ['brute', 'kdtree'])
+@pytest.mark.parametrize('models', [None, (0, 3, -1), (2, 5, 7, 8)])
+@pytest.mark.parametrize('aggregate', ['max', 'mean', 'p75'])
+def test_best_bonds_of_some_models(search, models, aggregate):
+    stacks = read_pdb('data/2MW2.pdb', models=None).stacks
+    chosen = read_pdb('data/2MW2.pdb', models=models).stacks
+    indices = list(range(len(stacks[0]))) if models is None else list(models)
+    for stack, chosen_stack in zip(stacks, chosen):
+        np.testing.assert_array_equal(chosen_stack, stack[indices])
+
+    xa, xb = chosen[0], chosen[1]
+    (cost, i, j), = best_pairs(xa, xb, search=search, aggregate=aggregate)
+    costs = np.array([[reference_cost(xa, xb, i, j, aggregate) for j in range(xb.shape[1])]
+                      for i in range(xa.shape[1])])
+    assert cost == pytest.approx(costs.min(), abs=1e-9)
+    assert costs[i, j] == pytest.approx(costs.min(), abs=1e-9)
+
+
+@pytest.mark.parametrize('text', ['', 'some', '0,', '0;-1', '1.5', 'ALL'])
+def test_bad_models_are_rejected(text):
+    with pytest.raises(ValueError):
+        parse_models(text)
+
+
+def test_models():
+    assert parse_models('all') is None
+    assert parse_models('0,-1') == (0, -1)
+    assert parse_models('3') == (3,)
+
+
+@pytest.mark.parametrize('aggregate', ['min', 'median', 'p', 'px', 'p-1', 'p101', 'pnan'])
+def test_bad_aggregates_are_rejected(aggregate):
+    with pytest.raises(ValueError):
+        check_aggregate(aggregate)
+
+
+@pytest.mark.parametrize('aggregate', ['max', 'mean', 'p0', 'p50', 'p99.5', 'p100'])
+def test_aggregates(aggregate):
+    assert check_aggregate(aggregate) == aggregate
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from spanning import chain_spheres, is_connected, lazy_kruskal, lower_bounds, neighbour_pairs, sparse_mst
+
+
+def random_stacks(n, seed):
+    # n chains of 5 atoms in two conformations, spread over a box much larger than a chain
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform(0, 100, (n, 1, 1, 3))
+    return centres + rng.normal(0, 2, (n, 2, 5, 3))
+
+
+def brute_costs(stacks, pairs):
+    costs = []
+    for a, b in pairs:
+        d = np.linalg.norm(stacks[a][:, :, None] - stacks[b][:, None], axis=-1)
+        costs.append((np.abs(d[0] - d[1]) + d[0]).min())
+    return costs
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('batch_size', [1, 4])
+def test_lazy_kruskal_finds_the_minimum_spanning_tree(seed, batch_size):
+    stacks = random_stacks(30, seed)
+    pairs = [(a, b) for a in range(len(stacks)) for b in range(a)]
+    costs = dict(zip(pairs, brute_costs(stacks, pairs)))
+    bounds = lower_bounds(chain_spheres(stacks), pairs)
+
+    assert all(bound <= costs[pair] + 1e-9 for pair, bound in zip(pairs, bounds))
+
+    edges, scored = lazy_kruskal(len(stacks), pairs, bounds, lambda batch: [costs[pair] for pair in batch],
+                                 batch_size)
+
+    assert edges == sparse_mst(len(stacks), pairs, [costs[pair] for pair in pairs])
+    assert len(scored) < len(pairs)
+
+
+@pytest.mark.parametrize('neighbours', [1, 2, 8])
+def test_neighbour_pairs_connect_all_the_chains(neighbours):
+    centroids = random_stacks(40, 0)[:, 0].mean(axis=1)
+    pairs = neighbour_pairs(centroids, neighbours)
+
+    assert is_connected(len(centroids), pairs)
+    assert all(a > b for a, b in pairs)